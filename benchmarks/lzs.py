@@ -0,0 +1,187 @@
+from argparse import ArgumentParser
+from io import BytesIO
+from random import Random
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from utils.lzs import COMPRESSION_LEVELS, LZS, MIN_MATCH, MAX_MATCH, OFFSET_BIAS, RING_MASK, RING_SIZE
+import os
+
+def synthetic_stream(size: int, seed: int = 0) -> bytes:
+    """
+    Build a valid LZS stream that inflates to roughly `size` bytes, mixing
+    literals with back-references the way field data compresses.
+    Only whole 8-token blocks and non-overlapping references are emitted.
+    """
+    rng = Random(seed)
+    payload = bytearray()
+    produced = 0
+    while produced < size:
+        flags = 0
+        block = bytearray()
+        for i in range(8):
+            if produced < MAX_MATCH or rng.random() < 0.4:
+                flags |= 1 << i
+                block.append(rng.choice((0, 0, 0, 0xFF, rng.randrange(256))))
+                produced += 1
+            else:
+                length = rng.randint(MIN_MATCH, MAX_MATCH)
+                distance = rng.randint(length, min(produced, RING_SIZE))
+                offset = (produced - distance - OFFSET_BIAS) & RING_MASK
+                block.append(offset & 0xFF)
+                block.append(((offset >> 4) & 0xF0) | (length - MIN_MATCH))
+                produced += length
+        payload.append(flags)
+        payload += block
+    return len(payload).to_bytes(4, 'little') + bytes(payload)
+
+def reference_un_lzs(input_path) -> BytesIO:
+    """
+    The original byte-at-a-time ring buffer decoder, kept as the reference
+    that LZS.decompress is checked and timed against.
+    """
+    elems = bytearray(RING_SIZE)
+    written = 0
+    bytebuff = bytearray(MAX_MATCH)
+    with open(input_path, 'rb') as f:
+        reader = f.read
+        filesize = int.from_bytes(reader(4), 'little')
+        stream = BytesIO()
+        while f.tell() < filesize + 4:
+            b_control = reader(1)
+            if not b_control:
+                break
+            for i in range(8):
+                if (1 << i) & ord(b_control):
+                    literal = reader(1)
+                    if not literal:
+                        break
+                    elems[written & RING_MASK] = ord(literal)
+                    written += 1
+                    stream.write(literal)
+                else:
+                    offsetsize = reader(2)
+                    if len(offsetsize) < 2:
+                        break
+                    length = (offsetsize[1] & 0x0F) + MIN_MATCH
+                    realoffset = (offsetsize[0] + ((offsetsize[1] & 0xF0) << 4) + OFFSET_BIAS) & RING_MASK
+                    distance = (written - realoffset) & RING_MASK
+                    for j in range(length):
+                        if 0 < distance < length:
+                            bytebuff[j] = elems[(realoffset + j % distance) & RING_MASK]
+                        else:
+                            bytebuff[j] = elems[(realoffset + j) & RING_MASK]
+                    for j in range(length):
+                        elems[written & RING_MASK] = bytebuff[j]
+                        written += 1
+                    stream.write(bytebuff[:length])
+        stream.seek(0)
+        return stream
+
+def measure(func, arg, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = perf_counter()
+        result = func(arg)
+        elapsed = perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def bench_file(path, repeat):
+    with open(path, 'rb') as f:
+        data = f.read()
+    legacy_time, legacy = measure(reference_un_lzs, path, repeat)
+    new_time, new = measure(LZS.decompress, data, repeat)
+    legacy = legacy.getvalue()
+    mb = len(new) / (1024 * 1024)
+    status = "identical" if legacy == bytes(new) else "MISMATCH"
+    print(f"{os.path.basename(path)}: {len(data)} -> {len(new)} bytes, "
+          f"reference {mb / legacy_time:.2f} MB/s, decompress {mb / new_time:.2f} MB/s "
+          f"(x{legacy_time / new_time:.1f}), {status}")
+    return status == "identical"
+
+def bench_compress(path, repeat):
+    with open(path, 'rb') as f:
+        data = bytes(LZS.decompress(f.read()))
+    mb = len(data) / (1024 * 1024)
+    ok = True
+    with TemporaryDirectory() as tmp:
+        for level in COMPRESSION_LEVELS:
+            elapsed, packed = measure(lambda d: LZS.compress(d, level), data, repeat)
+            roundtrip = os.path.join(tmp, "ROUNDTRIP.DAT")
+            with open(roundtrip, 'wb') as f:
+                f.write(packed)
+            same = bytes(LZS.decompress(packed)) == data and reference_un_lzs(roundtrip).getvalue() == data
+            ok &= same
+            print(f"{os.path.basename(path)}: compress {level} {len(data)} -> {len(packed)} bytes "
+                  f"({len(packed) / max(len(data), 1):.1%}), {mb / elapsed:.2f} MB/s, "
+                  f"round-trip {'ok' if same else 'MISMATCH'}")
+    return ok
+
+def roundtrip_cases(seed: int = 0):
+    """
+    Edge cases for the compressor: tiny inputs, sizes around the ring, runs that
+    reference the byte just written, references across the ring's wrap-around and
+    as far back as it reaches, and zeros that come from the window in front.
+    """
+    rng = Random(seed)
+    noise = lambda size: bytes(rng.randrange(256) for _ in range(size))
+    cases = {"empty": b""}
+    for size in range(1, MAX_MATCH + 1):
+        cases[f"{size} bytes"] = noise(size)
+        cases[f"{size} byte run"] = b"\x55" * size
+    for size in (RING_SIZE - 1, RING_SIZE, RING_SIZE + 1):
+        cases[f"{size} bytes"] = noise(size)
+        cases[f"{size} bytes repeating"] = (noise(700) * 6)[:size]
+    cases["overlapping runs"] = b"a" * 100 + b"abc" * 50 + b"abcd" * 7 + b"z"
+    block = noise(3500)
+    cases["ring wrap"] = block + block[500:] + block + block
+    block = noise(RING_SIZE)
+    cases["whole ring back"] = block + block + block[:MAX_MATCH]
+    cases["leading zeros"] = bytes(40) + noise(40) + bytes(RING_SIZE + 40)
+    return cases
+
+def check_roundtrips():
+    """Both compression levels, read back by LZS.decompress and the reference decoder."""
+    failed = []
+    checked = 0
+    with TemporaryDirectory() as tmp:
+        roundtrip = os.path.join(tmp, "ROUNDTRIP.DAT")
+        for name, data in roundtrip_cases().items():
+            for level in COMPRESSION_LEVELS:
+                checked += 1
+                packed = LZS.compress(data, level)
+                with open(roundtrip, 'wb') as f:
+                    f.write(packed)
+                if bytes(LZS.decompress(packed)) != data or reference_un_lzs(roundtrip).getvalue() != data:
+                    failed.append(f"{name} ({level})")
+    print(f"compress round-trips: {checked - len(failed)}/{checked} ok"
+          + (f", MISMATCH {', '.join(failed)}" if failed else ""))
+    return not failed
+
+def main():
+    parser = ArgumentParser(description="LZS decompression throughput")
+    parser.add_argument("files", nargs="*", help="LZS compressed files (DAT/MIM), synthetic data when omitted")
+    parser.add_argument("--size", type=int, default=1 << 20, help="synthetic output size in bytes")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--compress", action="store_true", help="also time both compression levels and check round-trips")
+    args = parser.parse_args()
+    ok = check_roundtrips()
+    if args.files:
+        for path in args.files:
+            ok &= bench_file(path, args.repeat)
+            if args.compress:
+                ok &= bench_compress(path, args.repeat)
+    else:
+        with TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "SYNTH.DAT")
+            with open(path, 'wb') as f:
+                f.write(synthetic_stream(args.size))
+            ok &= bench_file(path, args.repeat)
+            if args.compress:
+                ok &= bench_compress(path, args.repeat)
+    if not ok:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+from argparse import ArgumentParser
+from benchmarks.lzs import measure
+from construct import RepeatUntil
+from constructs.field.field import FieldHeaderConstruct, section_bounds
+from constructs.field.script import ScriptConstruct
+from constructs.opcodes import FieldOpcodeConstruct, fieldOpcodeDecoder, fieldOpcodes
+from random import Random
+from utils.lzs import LZS
+import os
+
+LegacyInstructionsConstruct = RepeatUntil(lambda obj, lst, ctx: obj.id == 0, FieldOpcodeConstruct)
+
+def synthetic_script(nb_runs: int, seed: int = 0):
+    """Random field instruction runs, each one ended by RET, and their offsets."""
+    rng = Random(seed)
+    usable = [t for t in fieldOpcodes if t.id != 0]
+    data = bytearray()
+    offsets = []
+    for _ in range(nb_runs):
+        offsets.append(len(data))
+        for _ in range(rng.randint(0, 60)):
+            template = rng.choice(usable)
+            data.append(template.id)
+            data += bytes(rng.randrange(256) for _ in range(template.size))
+        data.append(0)
+    return bytes(data), offsets
+
+def field_script(path):
+    """The script section of a DAT file and the offsets of its entity scripts."""
+    with open(path, 'rb') as f:
+        data = bytes(LZS.decompress(f.read()))
+    start, size = section_bounds(FieldHeaderConstruct.parse(data), "script")
+    section = data[start:start + size]
+    script = ScriptConstruct.parse(section)
+    offsets = sorted(set(s.address for e in script.entities for s in e.scripts))
+    return section, offsets
+
+def bench_script(name, data, offsets, repeat):
+    def legacy(offsets):
+        return [LegacyInstructionsConstruct.parse(data[o:]) for o in offsets]
+    def table(offsets):
+        buffer = memoryview(data)
+        return [fieldOpcodeDecoder.decode(buffer, o, 0)[0] for o in offsets]
+    legacy_time, expected = measure(legacy, offsets, repeat)
+    table_time, decoded = measure(table, offsets, repeat)
+    count = sum(len(i) for i in decoded)
+    status = "identical" if expected == decoded else "MISMATCH"
+    print(f"{name}: {len(offsets)} scripts, {count} instructions, "
+          f"construct {count / legacy_time:.0f} op/s, table {count / table_time:.0f} op/s "
+          f"(x{legacy_time / table_time:.1f}), {status}")
+    return status == "identical"
+
+def main():
+    parser = ArgumentParser(description="Field script opcode decoding throughput")
+    parser.add_argument("files", nargs="*", help="field DAT files, synthetic scripts when omitted")
+    parser.add_argument("--runs", type=int, default=500, help="synthetic instruction runs")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    ok = True
+    if args.files:
+        for path in args.files:
+            ok &= bench_script(os.path.basename(path), *field_script(path), args.repeat)
+    else:
+        ok = bench_script("synthetic", *synthetic_script(args.runs), args.repeat)
+    if not ok:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
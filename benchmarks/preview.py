@@ -0,0 +1,54 @@
+from argparse import ArgumentParser
+from benchmarks.lzs import measure
+from benchmarks.synthetic import write_corpus
+from concurrent.futures import ProcessPoolExecutor
+from constructs.field import Field
+from constructs.field.preview import draw_walkmesh, render_preview
+from constructs.mim import MIM
+from io import BytesIO
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import numpy as np
+import os
+
+def preview_field(dat_path, mim_path):
+    """Loads, renders and PNG encodes one preview, returns the encoded size."""
+    field = Field.from_file(dat_path, lazy=True)
+    output = BytesIO()
+    render_preview(field, MIM.from_file(mim_path)).save(output, format="PNG")
+    return len(output.getvalue())
+
+def main():
+    parser = ArgumentParser(description="Walkmesh over background preview throughput, in one process and in a pool")
+    parser.add_argument("-n", "--fields", type=int, default=16)
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--columns", type=int, default=40, help="walkmesh grid columns, two triangles per cell")
+    parser.add_argument("--save", default=None, help="also write the first preview to this PNG file")
+    args = parser.parse_args()
+    with TemporaryDirectory() as tmp:
+        fields = write_corpus(tmp, args.fields, columns=args.columns, rows=args.columns * 3 // 4)
+        if args.save:
+            field = Field.from_file(fields[0][1], lazy=True)
+            render_preview(field, MIM.from_file(fields[0][2])).save(args.save)
+        # the rasterizer alone, over an already rendered background
+        field = Field.from_file(fields[0][1], lazy=True)
+        camera = field.camera
+        background = np.array(field.tilemap.get_image_data(MIM.from_file(fields[0][2])))
+        draw_time, _ = measure(lambda image: draw_walkmesh(image, field.walkmesh, camera, field.tilemap.origin_x,
+                                                           field.tilemap.origin_y), background.copy(), 5)
+        start = perf_counter()
+        for _, dat_path, mim_path in fields:
+            preview_field(dat_path, mim_path)
+        single = perf_counter() - start
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            start = perf_counter()
+            list(executor.map(preview_field, [f[1] for f in fields], [f[2] for f in fields]))
+            pooled = perf_counter() - start
+    jobs = args.jobs or os.cpu_count()
+    print(f"draw_walkmesh: {field.walkmesh.nb_sectors} triangles in {draw_time * 1000:.1f} ms, "
+          f"{60 / draw_time:.0f}/min")
+    print(f"{args.fields} previews from DAT/MIM files: {args.fields * 60 / single:.0f}/min in one process, "
+          f"{args.fields * 60 / pooled:.0f}/min with {jobs} workers")
+
+if __name__ == '__main__':
+    main()
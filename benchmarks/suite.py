@@ -0,0 +1,121 @@
+from argparse import ArgumentParser
+from benchmarks.lzs import measure
+from benchmarks.synthetic import write_corpus
+from constructs.compiled import compiled
+from constructs.field.field import FieldHeaderConstruct, SECTIONS, section_bounds
+from constructs.mim import MIM, MIMConstruct
+from hashlib import sha1
+from io import BytesIO
+from json import dump, dumps, load
+from tempfile import TemporaryDirectory
+from utils.lzs import LZS
+import os
+import platform
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+def digest(data) -> str:
+    return sha1(data).hexdigest()
+
+def parse_mim(data) -> MIM:
+    mim = compiled(MIMConstruct).parse(data)
+    return MIM(mim.clut, mim.textures)
+
+def bench_field(name, dat_path, mim_path, repeat):
+    """Times every stage of loading, rendering and exporting one field, returns (timings, digests)."""
+    timings = {}
+    digests = {}
+    def timed(stage, func, arg):
+        timings[stage], result = measure(func, arg, repeat)
+        return result
+    with open(dat_path, 'rb') as f:
+        dat = f.read()
+    with open(mim_path, 'rb') as f:
+        mim_source = f.read()
+    data = bytes(timed("lzs.decompress.dat", LZS.decompress, dat))
+    mim_data = bytes(timed("lzs.decompress.mim", LZS.decompress, mim_source))
+    digests["dat"] = digest(data)
+    digests["mim"] = digest(mim_data)
+    header = FieldHeaderConstruct.parse(data)
+    sections = {}
+    for section, construct in SECTIONS.items():
+        start, size = section_bounds(header, section)
+        sections[section] = timed(f"parse.{section}", compiled(construct).parse, data[start:start + size])
+    mim = timed("parse.mim", parse_mim, mim_data)
+    # cold renders decode every tile, warm ones are served from the MIM caches
+    tilemap = sections["tilemap"]
+    image = timed("render.tilemap.cold", lambda m: tilemap.get_image_data(m()), lambda: MIM(mim.clut, mim.textures))
+    timed("render.tilemap.warm", tilemap.get_image_data, mim)
+    digests["tilemap.png"] = digest(image.tobytes())
+    vram = timed("render.mim", lambda m: m().get_image_data(0), lambda: MIM(mim.clut, mim.textures))
+    digests["mim.png"] = digest(vram.tobytes())
+    script = timed("export.json", lambda s: dumps(s.dump(), indent=2, ensure_ascii=False), sections["script"])
+    digests["script.json"] = digest(script.encode("utf-8"))
+    obj = timed("export.obj", lambda w: w.to_obj(), sections["walkmesh"])
+    digests["walkmesh.obj"] = digest(obj.encode("utf-8"))
+    timed("export.png", lambda i: i.save(BytesIO(), format="PNG"), image)
+    return timings, digests
+
+def compare(results, baseline, max_slowdown):
+    """Prints the changes against a baseline, returns False on a digest mismatch or a slowdown past max_slowdown."""
+    ok = True
+    for name, result in results["fields"].items():
+        expected = baseline["fields"].get(name)
+        if expected is None:
+            print(f"{name}: not in the baseline")
+            continue
+        for output, value in result["digests"].items():
+            if expected["digests"].get(output) != value:
+                ok = False
+                print(f"{name}: {output} digest changed")
+        for stage, seconds in result["timings"].items():
+            reference = expected["timings"].get(stage)
+            if not reference:
+                continue
+            ratio = seconds / reference
+            slow = max_slowdown is not None and ratio > max_slowdown
+            ok &= not slow
+            print(f"{name}: {stage:22} {seconds * 1000:9.2f} ms, baseline {reference * 1000:9.2f} ms "
+                  f"(x{ratio:.2f}){' SLOWER' if slow else ''}")
+    return ok
+
+def main():
+    parser = ArgumentParser(description="Benchmark decompression, parsing, rendering and export on a synthetic corpus")
+    parser.add_argument("-n", "--fields", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline", default=BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--update", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--output", default=None, help="also write the results to this JSON file")
+    parser.add_argument("--max-slowdown", type=float, default=None,
+                        help="fail when a stage is this many times slower than the baseline")
+    args = parser.parse_args()
+    results = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "corpus": {"fields": args.fields, "seed": args.seed},
+        "fields": {}
+    }
+    with TemporaryDirectory() as tmp:
+        for name, dat_path, mim_path in write_corpus(tmp, args.fields, args.seed):
+            timings, digests = bench_field(name, dat_path, mim_path, args.repeat)
+            results["fields"][name] = {"timings": timings, "digests": digests}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            dump(results, f, indent=2)
+    if args.update:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            dump(results, f, indent=2)
+        print(f"baseline written to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        raise SystemExit(f"no baseline at {args.baseline}, run with --update first")
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = load(f)
+    if baseline["corpus"] != results["corpus"]:
+        raise SystemExit(f"baseline corpus {baseline['corpus']} differs from {results['corpus']}")
+    if not compare(results, baseline, args.max_slowdown):
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+from argparse import ArgumentParser
+from constructs.opcodes import akaoOpcodes, fieldOpcodes
+from math import cos, sin
+from random import Random
+from struct import pack
+from utils.lzs import LZS
+import numpy as np
+import os
+
+# PSX address of the first section, as found in the field DAT headers
+FIRST_SECTION_PSX = 0x80114FE4
+NO_ACCESS = 0xFFFF
+
+def build_script(rng, nb_entities=24, nb_dialogs=40, nb_akaos=2, max_run=40):
+    """
+    Script section with entity scripts drawn from the field opcode table. About half of
+    the 32 slots of an entity reuse an earlier offset, like the game's scripts do.
+    """
+    usable = [t for t in fieldOpcodes if t.id != 0 and t.name != '(unused)']
+    header_size = 32 + 8 * nb_entities + 4 * nb_akaos + 64 * nb_entities
+    code = bytearray()
+    offsets = []
+    for _ in range(nb_entities):
+        slots = []
+        for s in range(32):
+            if s > 0 and rng.random() < 0.5:
+                slots.append(slots[rng.randrange(len(slots))])
+                continue
+            slots.append(header_size + len(code))
+            for _ in range(rng.randint(0, max_run)):
+                template = rng.choice(usable)
+                code.append(template.id)
+                code += bytes(rng.randrange(256) for _ in range(template.size))
+            code.append(0)
+        offsets.append(slots)
+    dialogs_offset = header_size + len(code)
+    texts = [bytes(rng.randrange(0, 0x60) for _ in range(rng.randint(1, 60))) + b'\xff' for _ in range(nb_dialogs)]
+    dialogs = bytearray(pack('<H', nb_dialogs))
+    position = 2 + 2 * nb_dialogs
+    for text in texts:
+        dialogs += pack('<H', position)
+        position += len(text)
+    for text in texts:
+        dialogs += text
+    akao_offsets = []
+    akaos = bytearray()
+    for a in range(nb_akaos):
+        akao_offsets.append(dialogs_offset + len(dialogs) + len(akaos))
+        akaos += build_akao(rng, a)
+    script = bytearray(pack('<HBBHHH', 0x0502, nb_entities, 0, dialogs_offset, nb_akaos, 512))
+    script += bytes(6) + b'CREATOR1' + b'SYNTHFLD'
+    for e in range(nb_entities):
+        script += f'ent{e}'.encode().ljust(8, b'\0')
+    for offset in akao_offsets:
+        script += pack('<I', offset)
+    for slots in offsets:
+        script += pack(f'<{len(slots)}H', *slots)
+    return bytes(script + code + dialogs + akaos)
+
+def build_akao(rng, id):
+    """AKAO frame with 1 to 4 channels, each one ended by an unconditional jump."""
+    usable = [t for t in akaoOpcodes if t.id not in (0xEE, 0xA0) and t.name != 'UNIMPLEMENTED']
+    channels = rng.randint(1, 4)
+    header = b'AKAO' + pack('<HHH', id, 0, 0) + bytes([0x98, 0x12, 0x25, 0x10, 0x30, 0x45])
+    header += ((1 << channels) - 1).to_bytes(3, 'little') + b'\0'
+    scripts = []
+    for _ in range(channels):
+        script = bytearray()
+        for _ in range(rng.randint(5, 50)):
+            template = rng.choice(usable)
+            script.append(template.id)
+            script += bytes(rng.randrange(256) for _ in range(template.size))
+        scripts.append(bytes(script) + b'\xee\0\0')
+    table = bytearray()
+    position = len(header) + 2 * channels
+    for c, script in enumerate(scripts):
+        # channel offsets are relative to the end of their own table entry
+        table += pack('<H', position - (len(header) + 2 * c + 2))
+        position += len(script)
+    return header + bytes(table) + b''.join(scripts)
+
+def build_walkmesh(rng, columns=40, rows=30, step=150, hole_rate=0.08):
+    """
+    Walkmesh made of a grid of quads split in two triangles, with rolling heights.
+    Some cells are left out, the access of the triangles around them is NO_ACCESS.
+    """
+    cells = [(i, j) for j in range(rows) for i in range(columns) if rng.random() >= hole_rate]
+    ids = {}
+    for i, j in cells:
+        ids[(i, j, 0)] = len(ids)
+        ids[(i, j, 1)] = len(ids)
+    heights = {}
+    def vertex(i, j):
+        if (i, j) not in heights:
+            heights[(i, j)] = int(200 * sin(i / 5) + 150 * cos(j / 7)) + rng.randint(-10, 10)
+        return (i * step - columns * step // 2, j * step - rows * step // 2, heights[(i, j)])
+    vertices = bytearray()
+    access = bytearray()
+    for i, j in cells:
+        p00, p10, p01, p11 = vertex(i, j), vertex(i + 1, j), vertex(i, j + 1), vertex(i + 1, j + 1)
+        # edges v0-v1, v1-v2, v2-v0: (p00 p10 p11) then (p00 p11 p01)
+        for corners, neighbours in (
+            ((p00, p10, p11), ((i, j - 1, 1), (i + 1, j, 1), (i, j, 1))),
+            ((p00, p11, p01), ((i, j, 0), (i, j + 1, 0), (i - 1, j, 0)))
+        ):
+            for x, y, z in corners:
+                vertices += pack('<hhhh', x, y, z, 0)
+            access += pack('<HHH', *(ids.get(n, NO_ACCESS) for n in neighbours))
+    return pack('<I', len(ids)) + bytes(vertices) + bytes(access)
+
+def _tile(destination_x, destination_y, source_x, source_y, clut):
+    return pack('<hhBBH', destination_x, destination_y, source_x, source_y, clut << 6)
+
+def _tp_blend(page_x, page_y, blending_mode, depth):
+    return pack('<H', (depth << 7) | (blending_mode << 5) | (page_y << 4) | page_x)
+
+def build_tilemap(rng, nb_background=3000, nb_sprites=600, nb_extra=100, width=320, height=240):
+    """
+    Tilemap with background tiles grouped by texture page, blended sprite tiles and
+    extra tiles. Pages are mostly 8-bit, with some 4-bit and 15-bit ones.
+    """
+    pages = [(x, y, rng.randrange(4), rng.choice((0, 1, 1, 1, 1, 2))) for x in range(5, 15) for y in range(2)]
+    def position():
+        return rng.randrange(-width // 2, width // 2 - 16), rng.randrange(-height // 2, height // 2 - 16)
+    def source():
+        return rng.randrange(0, 256, 16), rng.randrange(0, 256, 16), rng.randrange(16)
+    background_infos = []
+    background = bytearray()
+    remaining = nb_background
+    while remaining > 0:
+        count = min(remaining, rng.randint(20, 200))
+        background_infos.append((0x7FFC, 0, count))
+        for _ in range(count):
+            x, y = position()
+            background += _tile(x & ~15, y & ~15, *source())
+        background_infos.append((0x7FFE, rng.randrange(len(pages)), 0))
+        remaining -= count
+    sprite_infos = []
+    sprites = bytearray()
+    remaining = nb_sprites
+    while remaining > 0:
+        count = min(remaining, rng.randint(5, 60))
+        sprite_infos.append((0x7FF0, 0, count))
+        for _ in range(count):
+            sprites += _tile(*position(), *source()) + _tp_blend(*rng.choice(pages))
+            sprites += pack('<HBB', rng.randrange(4), (rng.randrange(2) << 7) | rng.randrange(128), rng.randrange(4))
+        remaining -= count
+    extra_infos = [(0x7FF1, 0, nb_extra), (0x7FFE, 0, 0)] if nb_extra else []
+    extra = bytearray()
+    for _ in range(nb_extra):
+        extra += _tile(*position(), *source()) + bytes([rng.randrange(256), rng.randrange(4)])
+    infos = bytearray()
+    for layer in (background_infos, sprite_infos, extra_infos, []):
+        for type, pos, count in layer:
+            infos += pack('<HHH', type, pos, count)
+        infos += pack('<H', 0x7FFF)
+    texture_pages = b''.join(_tp_blend(*page) for page in pages)
+    background_offset = 16 + len(infos)
+    texture_page_offset = background_offset + len(background)
+    sprite_offset = texture_page_offset + len(texture_pages)
+    extra_offset = sprite_offset + len(sprites)
+    return (pack('<IIII', background_offset, texture_page_offset, sprite_offset, extra_offset)
+            + bytes(infos) + bytes(background) + texture_pages + bytes(sprites) + bytes(extra))
+
+def build_camera(columns=40, rows=30, step=150, zoom=300, tilt=0.8):
+    """
+    Camera looking down at the middle of build_walkmesh's grid from the -y side, far
+    enough for the mesh to fill about 200 pixels, so previews of the corpus show it.
+    """
+    # the grid's bounds, its rolling heights stay within +-360
+    low = np.array([-(columns * step // 2), -(rows * step // 2), -360])
+    high = np.array([columns * step - columns * step // 2, rows * step - rows * step // 2, 360])
+    center = (low + high) / 2 / 4096
+    radius = np.linalg.norm(high - low) / 2 / 4096
+    forward = np.array([0.0, np.cos(tilt), -np.sin(tilt)])
+    right = np.array([1.0, 0.0, 0.0])
+    up = np.cross(right, forward)
+    eye = center - forward * radius * zoom / 100
+    pos = -np.array([right @ eye, up @ eye, forward @ eye])
+    # 1/4096 units, the y axis and position are stored flipped
+    axes = np.round(np.concatenate((right, -up, forward)) * 4096).astype(int).tolist()
+    x, y, z = np.round(pos * 4096 * [1, -1, 1]).astype(int).tolist()
+    return pack('<9hh3iih', *axes, 0, x, y, z, 0, zoom)
+
+def build_dat(seed=0, nb_entities=24, nb_tiles=3000, columns=40, rows=30) -> bytes:
+    """Decompressed field DAT: header then script, walkmesh, tilemap, camera and empty trigger/encounter/model."""
+    rng = Random(seed)
+    sections = [
+        build_script(rng, nb_entities),
+        build_walkmesh(rng, columns, rows),
+        build_tilemap(rng, nb_tiles, nb_tiles // 5, nb_tiles // 30),
+        build_camera(columns, rows),
+        bytes(8), bytes(8), bytes(8)
+    ]
+    pointers = []
+    position = FIRST_SECTION_PSX
+    for section in sections:
+        pointers.append(position)
+        position += len(section)
+    return pack('<7I', *pointers) + b''.join(sections)
+
+def build_mim(seed=0, nb_palettes=16, texture_x=320, texture_width=704) -> bytes:
+    """Decompressed MIM: a 256 color CLUT per palette and two texture blocks covering pages 5 to 15."""
+    rng = Random(seed + 1000)
+    clut = bytearray()
+    for _ in range(nb_palettes):
+        for c in range(256):
+            red = rng.choice((0, rng.randrange(32)))
+            green, blue = rng.randrange(32), rng.randrange(32)
+            stp = 1 if rng.random() < 0.1 else 0
+            if c == 0:
+                red = green = blue = stp = 0
+            clut += pack('<H', (stp << 15) | (blue << 10) | (green << 5) | red)
+    mim = bytearray(pack('<IHHHH', 12 + len(clut), 0, 480, 256, nb_palettes) + clut)
+    for y in (0, 256):
+        texture = bytes(rng.randrange(256) if rng.random() < 0.7 else 0 for _ in range(texture_width * 256 * 2))
+        mim += pack('<IHHHH', 12 + len(texture), texture_x, y, texture_width, 256) + texture
+    return bytes(mim)
+
+def write_corpus(directory, nb_fields=1, seed=0, level="fast", **sizes):
+    """Writes SYNTHnn.DAT/MIM LZS compressed files, returns their (name, dat path, mim path)."""
+    os.makedirs(directory, exist_ok=True)
+    fields = []
+    for i in range(nb_fields):
+        name = f"SYNTH{i:02d}"
+        dat_path = os.path.join(directory, name + ".DAT")
+        mim_path = os.path.join(directory, name + ".MIM")
+        with open(dat_path, 'wb') as f:
+            f.write(LZS.compress(build_dat(seed + i, **sizes), level))
+        with open(mim_path, 'wb') as f:
+            f.write(LZS.compress(build_mim(seed + i), level))
+        fields.append((name, dat_path, mim_path))
+    return fields
+
+def main():
+    parser = ArgumentParser(description="Write a corpus of synthetic field DAT/MIM files")
+    parser.add_argument("directory")
+    parser.add_argument("-n", "--fields", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--entities", type=int, default=24)
+    parser.add_argument("--tiles", type=int, default=3000, help="background tiles, sprites and extra tiles scale with it")
+    parser.add_argument("--columns", type=int, default=40, help="walkmesh grid columns, two triangles per cell")
+    parser.add_argument("--rows", type=int, default=30)
+    args = parser.parse_args()
+    for name, dat_path, mim_path in write_corpus(args.directory, args.fields, args.seed, nb_entities=args.entities,
+                                                  nb_tiles=args.tiles, columns=args.columns, rows=args.rows):
+        print(f"{name}: {os.path.getsize(dat_path)} + {os.path.getsize(mim_path)} bytes")
+
+if __name__ == '__main__':
+    main()
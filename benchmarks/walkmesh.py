@@ -0,0 +1,99 @@
+from argparse import ArgumentParser
+from benchmarks.lzs import measure
+from benchmarks.synthetic import build_walkmesh
+from constructs.field.field import FieldHeaderConstruct, section_bounds
+from constructs.field.navigation import WalkmeshGraph
+from constructs.field.walkmesh import WalkmeshConstruct, WalkmeshGrid
+from random import Random
+from utils.lzs import LZS
+import numpy as np
+import os
+
+def field_walkmesh(path):
+    with open(path, 'rb') as f:
+        data = bytes(LZS.decompress(f.read()))
+    start, size = section_bounds(FieldHeaderConstruct.parse(data), "walkmesh")
+    return WalkmeshConstruct.parse(data[start:start + size])
+
+def brute_locate(grid, points):
+    """Lowest id triangle under each point, testing every triangle."""
+    ids = np.full(len(points), -1, dtype=np.int64)
+    everything = np.arange(len(grid.corners))
+    for i, point in enumerate(points):
+        u, v = grid._barycentric(np.broadcast_to(point, (len(everything), 2)), everything)
+        hit = np.flatnonzero((u >= -grid.EPSILON) & (v >= -grid.EPSILON) & (u + v <= 1 + grid.EPSILON))
+        if len(hit):
+            ids[i] = hit[0]
+    return ids
+
+def bench_walkmesh(name, walkmesh, nb_points, nb_rays, repeat, seed=0):
+    rng = np.random.default_rng(seed)
+    build_time, grid = measure(WalkmeshGrid, walkmesh, repeat)
+    low, high = walkmesh.bounds()
+    # a margin around the mesh so some queries miss
+    margin = (high - low) * 0.05
+    points = rng.uniform(low[:2] - margin[:2], high[:2] + margin[:2], (nb_points, 2))
+    locate_time, (ids, _) = measure(grid.locate, points, repeat)
+    heights_time, _ = measure(grid.heights, points, repeat)
+    # rays cast down from above the mesh, tilted up to 45 degrees
+    origins = np.column_stack((points[:nb_rays], np.full(min(nb_rays, nb_points), high[2] + 1000.0)))
+    directions = np.column_stack((rng.uniform(-1, 1, (len(origins), 2)), np.full(len(origins), -1.0)))
+    ray_time, _ = measure(lambda o: grid.raycast(o, directions), origins, repeat)
+    sample = min(len(points), 200)
+    status = "identical" if np.array_equal(brute_locate(grid, points[:sample]), ids[:sample]) else "MISMATCH"
+    print(f"{name}: {walkmesh.nb_sectors} triangles, {grid.columns}x{grid.rows} cells, build {build_time * 1000:.1f} ms, "
+          f"locate {nb_points / locate_time:.0f} q/s ({(ids >= 0).mean():.0%} on mesh), "
+          f"heights {nb_points / heights_time:.0f} q/s, raycast {len(origins) / ray_time:.0f} q/s, {status}")
+    return status == "identical"
+
+def bench_paths(name, walkmesh, nb_paths, seed=0):
+    """Path and reachability queries between random positions, path costs checked against Dijkstra."""
+    rng = np.random.default_rng(seed)
+    low, high = walkmesh.bounds()
+    starts = rng.uniform(low[:2], high[:2], (nb_paths, 2))
+    goals = rng.uniform(low[:2], high[:2], (nb_paths, 2))
+    def prepare(walkmesh):
+        graph = WalkmeshGraph(walkmesh)
+        graph.components, graph.landmarks
+        return graph
+    prepare_time, graph = measure(prepare, walkmesh, 1)
+    path_time, paths = measure(lambda _: graph.find_paths(starts, goals), None, 1)
+    reach_time, reachable = measure(lambda _: graph.reachable(starts, goals), None, 1)
+    found = [p for p in paths if p is not None]
+    status = "optimal" if np.array_equal(reachable, [p is not None for p in paths]) else "MISMATCH"
+    for path in found[:50]:
+        triangles = path.triangles
+        cost = sum(graph.costs[i][graph.neighbours[i].tolist().index(j)] for i, j in zip(triangles, triangles[1:]))
+        if not np.isclose(cost, graph.distances(triangles[0])[triangles[-1]]):
+            status = "MISMATCH"
+    print(f"{name}: {len(np.unique(graph.components))} components, "
+          f"prepare {prepare_time * 1000:.1f} ms, find_path {nb_paths / path_time:.0f} q/s ({len(found)} found), "
+          f"reachable {nb_paths / reach_time:.0f} q/s, {status}")
+    return status == "optimal"
+
+def main():
+    parser = ArgumentParser(description="Walkmesh spatial index and path-finding throughput")
+    parser.add_argument("files", nargs="*", help="field DAT files, synthetic walkmeshes when omitted")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[12, 40, 170],
+                        help="synthetic grid sizes, two triangles per cell, 180 at most for 16-bit ids")
+    parser.add_argument("--points", type=int, default=100000)
+    parser.add_argument("--rays", type=int, default=2000)
+    parser.add_argument("--paths", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    ok = True
+    if args.files:
+        for path in args.files:
+            walkmesh = field_walkmesh(path)
+            ok &= bench_walkmesh(os.path.basename(path), walkmesh, args.points, args.rays, args.repeat)
+            ok &= bench_paths(os.path.basename(path), walkmesh, args.paths)
+    else:
+        for size in args.sizes:
+            walkmesh = WalkmeshConstruct.parse(build_walkmesh(Random(size), size, size, step=20))
+            ok &= bench_walkmesh(f"synthetic {size}x{size}", walkmesh, args.points, args.rays, args.repeat)
+            ok &= bench_paths(f"synthetic {size}x{size}", walkmesh, args.paths)
+    if not ok:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
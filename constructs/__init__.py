@@ -1,4 +1,5 @@
 from constructs.field import *
 from constructs.akao import AKAO, AKAOScript, AKAOConstruct
 from constructs.mim import MIM, CLUT, Texture, Palette, PaletteEntry, MIMConstruct
+from constructs.vram import VRAM
 from constructs.opcodes import Opcode, Operand, FieldOpcodeConstruct, AKAOOpcodeConstruct
\ No newline at end of file
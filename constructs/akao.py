@@ -1,6 +1,6 @@
-from construct import Adapter, Array, BitsInteger, BitStruct, Byte, Computed, Const, ExprAdapter, Padding, RepeatUntil, Pointer, Struct, Tell
+from construct import Adapter, Array, BitsInteger, BitStruct, Byte, Computed, Const, ExprAdapter, Padding, Pointer, Struct, Tell
 from construct import Int8ul, Int16ul, Int24ul, Int32ul, this
-from constructs.opcodes import Opcode, AKAOOpcodeConstruct
+from constructs.opcodes import Opcode, AKAOInstructionsConstruct
 from dataclasses import dataclass, field
 from datetime import datetime
 from typing import List
@@ -10,6 +10,12 @@ class AKAOScript:
     address: int
     instructions: List[Opcode]
 
+    def dump(self) -> dict:
+        return {
+            "address": self.address,
+            "instructions": [i.dump() for i in self.instructions]
+        }
+
 @dataclass
 class AKAO:
     id: int
@@ -20,6 +26,17 @@ class AKAO:
     nb_channels: int
     scripts: List[AKAOScript]
 
+    def dump(self) -> dict:
+        return {
+            "id": self.id,
+            "length": self.length,
+            "reverb_type": self.reverb_type,
+            "timestamp": self.timestamp.isoformat(),
+            "mask": self.mask,
+            "nb_channels": self.nb_channels,
+            "scripts": [s.dump() for s in self.scripts]
+        }
+
 class AKAOAdapter(Adapter):
     def _decode(self, obj, context, path):
         return AKAO(
@@ -74,11 +91,8 @@ AKAOConstruct = AKAOAdapter(Struct(
             "currentPos" / Tell,
             "instructions" / Pointer(
                 lambda ctx: ctx.currentPos + ctx.offset,
-                RepeatUntil(lambda obj, lst, ctx: obj.id == 0xEE, AKAOOpcodeConstruct)
+                AKAOInstructionsConstruct
             )
         )
     )
 ))
-
-AKAOTimestamp.compile()
-AKAOConstruct.compile()
\ No newline at end of file
@@ -0,0 +1,9 @@
+from functools import lru_cache
+
+@lru_cache(maxsize=None)
+def compiled(construct):
+    """
+    The compiled parser of a construct, compiled on first use instead of at
+    import time. Parts that can't be compiled keep their regular parser.
+    """
+    return construct.compile()
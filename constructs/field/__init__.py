@@ -1,5 +1,5 @@
-from constructs.field.field import Field, FieldConstruct
+from constructs.field.field import Field, FieldConstruct, FieldHeaderConstruct
 from constructs.field.camera import Camera, CameraConstruct
-from constructs.field.script import Script, ScriptConstruct, EntityScript, Entity
+from constructs.field.script import Script, ScriptConstruct, ScriptHeaderConstruct, EntityScript, Entity
 from constructs.field.walkmesh import Walkmesh, WalkmeshConstruct
 from constructs.field.tilemap import Tilemap, TilemapConstruct
\ No newline at end of file
@@ -2,6 +2,7 @@ from construct import Adapter, Padding, Struct
 from construct import Int16ul, Int16sl, Int32sl
 from dataclasses import dataclass
 from globals import Vertex3
+import numpy as np
 
 @dataclass
 class Camera:
@@ -23,6 +24,26 @@ class Camera:
     def tz(self):
         return -((self.pos.x * self.axis_x.z) + (self.pos.y * self.axis_y.z) + (self.pos.z * self.axis_z.z))
 
+    def project(self, points):
+        """
+        Perspective projection of (N, 3) world points like the PSX GTE does it: camera space
+        is the axes times the point plus pos, the screen is zoom * (x, y) / z around the
+        center of the screen with y down, the space the tile destinations are in.
+        Returns the (N, 2) screen positions and the (N,) depths, only depths > 0 are in front.
+        """
+        axes = np.array([
+            [self.axis_x.x, self.axis_x.y, self.axis_x.z],
+            [self.axis_y.x, self.axis_y.y, self.axis_y.z],
+            [self.axis_z.x, self.axis_z.y, self.axis_z.z]
+        ])
+        # the axes and pos are in 1/4096 units, y flipped when decoded
+        view = np.asarray(points, dtype=np.float64).reshape(-1, 3) / 4096 @ axes.T
+        view += [self.pos.x, self.pos.y, self.pos.z]
+        depth = view[:, 2]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            screen = self.zoom * np.column_stack((view[:, 0], -view[:, 1])) / depth[:, None]
+        return screen, depth
+
 class CameraAdapter(Adapter):
     def _decode(self, obj, context, path):
         vx=Vertex3((obj.camera_vector_x.x / 4096),(obj.camera_vector_x.y / 4096), (obj.camera_vector_x.z / 4096))
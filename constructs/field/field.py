@@ -1,24 +1,122 @@
 from construct import Padding, Peek, Pointer, Struct
 from construct import Int32ul, this
-from .script import ScriptConstruct
+from .script import ScriptConstruct, ScriptHeaderConstruct
 from .walkmesh import WalkmeshConstruct
 from .camera import CameraConstruct
+from ..compiled import compiled
 from .tilemap import TilemapConstruct
-from globals import lzs
+from utils.lzs import LZS, LZSReader
+from utils.profiling import profiler
+import os
+
+SECTION_NAMES = ("script", "walkmesh", "tilemap", "camera", "trigger", "encounter", "model")
+
+def section_bounds(header, name):
+    """Returns (start, size) of a section in the decompressed data, size is None for the last one."""
+    offsets = [header[f"{n}_offset_psx"] - header.first_offset + 28 for n in SECTION_NAMES]
+    start = offsets[SECTION_NAMES.index(name)]
+    following = [o for o in offsets if o > start]
+    return start, (min(following) - start if following else None)
+
+def section_objects(name, section) -> int:
+    """Number of decoded objects in a section, for profiling."""
+    if name == "script":
+        return section.decode_stats.get("decoded_instructions", 0)
+    if name == "walkmesh":
+        return section.nb_sectors
+    if name == "tilemap":
+        return len(section.background_tiles) + len(section.sprite_tiles) + len(section.extra_tiles)
+    return 1
+
+def lazy_section(name):
+    # Parsed from the decompressed data on first access, then memoized
+    def getter(self):
+        if name not in self._sections and self._data is not None:
+            start, size = section_bounds(self._header, name)
+            end = None if size is None else start + size
+            with profiler.stage(f"field.{name}", bytes=(len(self._data) if end is None else end) - start) as record:
+                self._sections[name] = compiled(SECTIONS[name]).parse(self._data[start:end])
+                record["objects"] = section_objects(name, self._sections[name])
+        return self._sections.get(name)
+    def setter(self, value):
+        self._sections[name] = value
+    return property(getter, setter)
 
 class Field:
-    def __init__(self, script=None, walkmesh=None, tilemap=None, camera=None):
-        self.script = script
-        self.walkmesh = walkmesh
-        self.tilemap = tilemap
-        self.camera = camera
+    def __init__(self, script=None, walkmesh=None, tilemap=None, camera=None, data=None):
+        self._data = data
+        self._header = None if data is None else FieldHeaderConstruct.parse(data)
+        self._sections = {}
+        for name, section in (("script", script), ("walkmesh", walkmesh), ("tilemap", tilemap), ("camera", camera)):
+            if section is not None or data is None:
+                self._sections[name] = section
+
+    script = lazy_section("script")
+    walkmesh = lazy_section("walkmesh")
+    tilemap = lazy_section("tilemap")
+    camera = lazy_section("camera")
+
+    def dump(self) -> dict:
+        return {"script": self.script.dump()}
 
     @classmethod
-    def from_file(cls, path: str):
-        stream = lzs.un_lzs(path)
-        field = FieldConstruct.parse_stream(stream)
+    def from_file(cls, path: str, lazy=False):
+        """
+        With lazy=True the file is only decompressed here, each section is
+        parsed the first time it is accessed.
+        """
+        if lazy:
+            with open(path, 'rb') as f:
+                source = f.read()
+            with profiler.stage("lzs.decompress", input_bytes=len(source)) as record:
+                data = LZS.decompress(source)
+                record["bytes"] = len(data)
+            return cls(data=data)
+        with profiler.stage("lzs.decompress", input_bytes=os.path.getsize(path)) as record:
+            stream = LZS.un_lzs(path)
+            record["bytes"] = stream.getbuffer().nbytes
+        with profiler.stage("field.parse", bytes=stream.getbuffer().nbytes) as record:
+            field = compiled(FieldConstruct).parse_stream(stream)
+            record["objects"] = sum(section_objects(n, field[n]) for n in SECTIONS)
         return cls(script=field.script,walkmesh=field.walkmesh, tilemap=field.tilemap, camera=field.camera)
 
+    @staticmethod
+    def read_script_header(path: str):
+        """
+        Parse only the script header (scale, creator, name, counts) of a field,
+        decompressing no further than the end of that header.
+        """
+        stream = LZSReader.open(path)
+        header = FieldHeaderConstruct.parse_stream(stream)
+        stream.seek(header.script_offset_psx - header.first_offset + 28)
+        return ScriptHeaderConstruct.parse_stream(stream)
+
+    @staticmethod
+    def read_section(path: str, name: str, index=None):
+        """
+        Decompress and parse a single section ("script", "walkmesh", "tilemap"
+        or "camera"). With an LZSIndex (see LZSIndex.for_file), decoding
+        resumes from the checkpoint nearest to the section.
+        """
+        if name not in SECTIONS:
+            raise ValueError(f"Unknown field section {name!r}")
+        with open(path, 'rb') as f:
+            data = f.read()
+        header = FieldHeaderConstruct.parse(LZS.decompress(data, FieldHeaderConstruct.sizeof()))
+        start, size = section_bounds(header, name)
+        return compiled(SECTIONS[name]).parse(LZS.decompress_range(data, start, size, index))
+
+FieldHeaderConstruct = Struct(
+    "first_offset" / Peek(Int32ul),
+    "script_offset_psx" / Int32ul,
+    "walkmesh_offset_psx" / Int32ul,
+    "tilemap_offset_psx" / Int32ul,
+    "camera_offset_psx" / Int32ul,
+    "trigger_offset_psx" / Int32ul,
+    "encounter_offset_psx" / Int32ul,
+    "model_offset_psx" / Int32ul
+)
+
 FieldConstruct = Struct(
     "first_offset" / Peek(Int32ul),
     "script_offset_psx" / Int32ul,
@@ -41,4 +139,11 @@ FieldConstruct = Struct(
         this.camera_offset_psx - this.first_offset + 28,
         CameraConstruct
     )
-)
\ No newline at end of file
+)
+
+SECTIONS = {
+    "script": ScriptConstruct,
+    "walkmesh": WalkmeshConstruct,
+    "tilemap": TilemapConstruct,
+    "camera": CameraConstruct
+}
@@ -0,0 +1,252 @@
+from constructs.field.walkmesh import NO_ACCESS, Walkmesh
+from dataclasses import dataclass
+from heapq import heappop, heappush
+from math import inf as INFINITY
+from typing import List, Optional
+import numpy as np
+
+@dataclass
+class Path:
+    triangles: List[int]
+    # x/y/z of the start, the corners it turns around and the goal
+    points: np.ndarray
+    length: float
+
+class WalkmeshGraph:
+    """
+    Triangle adjacency from the access pool, edge k of a triangle going from vertex k to
+    vertex k + 1. Moving to a neighbour costs the distance from the centroid to the middle
+    of the shared edge and on to the neighbour's centroid. Access ids past the last
+    triangle are taken as NO_ACCESS.
+    """
+    LANDMARKS = 8
+
+    def __init__(self, walkmesh: Walkmesh):
+        self.walkmesh = walkmesh
+        corners = walkmesh.vertices.astype(np.float64)
+        count = len(corners)
+        self.corners = corners
+        self.centroids = corners.mean(axis=1)
+        self.midpoints = (corners + np.roll(corners, -1, axis=1)) / 2
+        neighbours = walkmesh.access.astype(np.int64)
+        neighbours[(neighbours == NO_ACCESS) | (neighbours >= count)] = -1
+        self.neighbours = neighbours
+        linked = neighbours >= 0
+        targets = self.centroids[np.where(linked, neighbours, 0)]
+        self.costs = np.where(
+            linked,
+            np.linalg.norm(self.midpoints - self.centroids[:, None], axis=2)
+            + np.linalg.norm(targets - self.midpoints, axis=2),
+            np.inf
+        )
+        # plain lists for the search loop, indexing numpy arrays one item at a time is slow
+        self._edges = [
+            [(j, cost) for j, cost in zip(row, costs) if j >= 0]
+            for row, costs in zip(neighbours.tolist(), self.costs.tolist())
+        ]
+        self._centroids = [tuple(c) for c in self.centroids.tolist()]
+        self._corners = [[tuple(v) for v in c] for c in corners.tolist()]
+        self._neighbours = neighbours.tolist()
+        self._components = None
+        self._undirected = None
+        self._landmarks = None
+
+    @property
+    def components(self) -> np.ndarray:
+        """Connected component of each triangle, labelled by its lowest triangle id, access taken both ways."""
+        if self._components is None:
+            rows, sides = np.nonzero(self.neighbours >= 0)
+            sources = np.concatenate([rows, self.neighbours[rows, sides]])
+            targets = np.concatenate([self.neighbours[rows, sides], rows])
+            labels = np.arange(len(self.neighbours))
+            while True:
+                # hook every triangle to its lowest labelled neighbour, then shortcut the label chains
+                updated = labels.copy()
+                np.minimum.at(updated, sources, labels[targets])
+                updated = updated[updated]
+                if np.array_equal(updated, labels):
+                    break
+                labels = updated
+            self._components = labels
+        return self._components
+
+    def distances(self, source: int) -> np.ndarray:
+        """Dijkstra distance from source to every triangle with links taken both ways, inf when unreachable."""
+        if self._undirected is None:
+            undirected = [dict(edges) for edges in self._edges]
+            for i, edges in enumerate(self._edges):
+                for j, cost in edges:
+                    undirected[j][i] = min(cost, undirected[j].get(i, INFINITY))
+            self._undirected = [list(edges.items()) for edges in undirected]
+        edges = self._undirected
+        distances = [INFINITY] * len(edges)
+        distances[source] = 0.0
+        heap = [(0.0, source)]
+        while heap:
+            cost, i = heappop(heap)
+            if cost > distances[i]:
+                continue
+            for j, step in edges[i]:
+                total = cost + step
+                if total < distances[j]:
+                    distances[j] = total
+                    heappush(heap, (total, j))
+        return np.array(distances)
+
+    @property
+    def landmarks(self) -> np.ndarray:
+        """
+        Distances from LANDMARKS far apart triangles, (LANDMARKS, nb_sectors) with 0 where
+        unreachable. |d(L, a) - d(L, b)| is a lower bound of the a to b cost for A*.
+        """
+        if self._landmarks is None:
+            count = len(self._edges)
+            rows = []
+            nearest = np.full(count, INFINITY)
+            for _ in range(min(WalkmeshGraph.LANDMARKS, count)):
+                # the farthest triangle from the landmarks so far, unreachable ones first
+                distances = self.distances(int(np.argmax(nearest)) if rows else 0)
+                nearest = np.minimum(nearest, distances)
+                rows.append(distances)
+            landmarks = np.array(rows).reshape(-1, count)
+            landmarks[np.isinf(landmarks)] = 0.0
+            self._landmarks = landmarks
+        return self._landmarks
+
+    def heuristic(self, goal: int) -> list:
+        """Lower bound of the cost from every triangle to goal, as a list for the search loop."""
+        landmarks = self.landmarks
+        bounds = np.abs(landmarks - landmarks[:, goal:goal + 1]).max(axis=0, initial=0.0)
+        return np.maximum(bounds, np.linalg.norm(self.centroids - self.centroids[goal], axis=1)).tolist()
+
+    def reachable(self, starts, goals) -> np.ndarray:
+        """Whether each (x, y) goal can be walked to from its start, by connectivity only."""
+        grid = self.walkmesh.grid
+        start_ids = grid.locate(starts)[0]
+        goal_ids = grid.locate(goals)[0]
+        components = self.components
+        found = (start_ids >= 0) & (goal_ids >= 0)
+        return found & (components[start_ids] == components[goal_ids])
+
+    def search(self, start: int, goal: int) -> Optional[List[int]]:
+        """A* over the triangles, returns the ids from start to goal or None."""
+        if start == goal:
+            return [start]
+        components = self.components
+        if components[start] != components[goal]:
+            return None
+        edges = self._edges
+        heuristic = self.heuristic(goal)
+        costs = {start: 0.0}
+        parents = {start: -1}
+        heap = [(heuristic[start], 0.0, start)]
+        while heap:
+            _, cost, i = heappop(heap)
+            if cost > costs[i]:
+                # reached again since for less
+                continue
+            if i == goal:
+                triangles = []
+                while i >= 0:
+                    triangles.append(i)
+                    i = parents[i]
+                return triangles[::-1]
+            for j, step in edges[i]:
+                total = cost + step
+                if total < costs.get(j, INFINITY):
+                    costs[j] = total
+                    parents[j] = i
+                    heappush(heap, (total + heuristic[j], total, j))
+        # only links that go one way
+        return None
+
+    def portals(self, triangles: List[int]):
+        """(left, right) x/y/z corners of the edges crossed along a list of triangles."""
+        portals = []
+        for i, j in zip(triangles, triangles[1:]):
+            side = self._neighbours[i].index(j)
+            a, b = self._corners[i][side], self._corners[i][(side + 1) % 3]
+            # seen from inside the triangle, the left corner is counter-clockwise of the right one
+            if _cross(self._centroids[i], b, a) > 0:
+                portals.append((a, b))
+            else:
+                portals.append((b, a))
+        return portals
+
+    def position(self, point, triangle: int):
+        """x/y/z of a point, z interpolated on the triangle when only x/y are given."""
+        x, y = float(point[0]), float(point[1])
+        if len(point) > 2:
+            return x, y, float(point[2])
+        (ax, ay, az), (bx, by, bz), (cx, cy, cz) = self._corners[triangle]
+        det = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+        if det == 0:
+            return x, y, (az + bz + cz) / 3
+        u = ((x - ax) * (cy - ay) - (y - ay) * (cx - ax)) / det
+        v = ((bx - ax) * (y - ay) - (by - ay) * (x - ax)) / det
+        return x, y, az + u * (bz - az) + v * (cz - az)
+
+    def find_path(self, start, goal, start_triangle: int = None, goal_triangle: int = None) -> Optional[Path]:
+        """
+        Shortest corridor between two world positions, straightened with the funnel algorithm.
+        The triangles default to the ones under the x/y positions, given ones (e.g. from a
+        script) decide between overlapping floors. Returns None when the goal can't be reached.
+        """
+        if start_triangle is None or goal_triangle is None:
+            ids = self.walkmesh.grid.locate([start[:2], goal[:2]])[0].tolist()
+            start_triangle = ids[0] if start_triangle is None else start_triangle
+            goal_triangle = ids[1] if goal_triangle is None else goal_triangle
+        if start_triangle < 0 or goal_triangle < 0:
+            return None
+        triangles = self.search(start_triangle, goal_triangle)
+        if triangles is None:
+            return None
+        start = self.position(start, start_triangle)
+        goal = self.position(goal, goal_triangle)
+        corners = np.array(_funnel(start, goal, self.portals(triangles)))
+        return Path(triangles=triangles, points=corners, length=float(np.linalg.norm(np.diff(corners, axis=0), axis=1).sum()))
+
+    def find_paths(self, starts, goals) -> List[Optional[Path]]:
+        """find_path for arrays of x/y/z positions, locating them all at once."""
+        starts = np.asarray(starts, dtype=np.float64)
+        goals = np.asarray(goals, dtype=np.float64)
+        start_ids = self.walkmesh.grid.locate(starts[:, :2])[0].tolist()
+        goal_ids = self.walkmesh.grid.locate(goals[:, :2])[0].tolist()
+        return [self.find_path(start, goal, s, g) for start, goal, s, g in zip(starts, goals, start_ids, goal_ids)]
+
+def _cross(origin, a, b) -> float:
+    # > 0 when b is counter-clockwise of a seen from origin, on the x/y plane
+    return (a[0] - origin[0]) * (b[1] - origin[1]) - (a[1] - origin[1]) * (b[0] - origin[0])
+
+def _funnel(start, goal, portals) -> list:
+    """Simple stupid funnel: the taut path from start to goal through the portals."""
+    portals = [(start, start)] + portals + [(goal, goal)]
+    points = [start]
+    apex = left = right = start
+    apex_index = left_index = right_index = 0
+    i = 1
+    while i < len(portals):
+        portal_left, portal_right = portals[i]
+        # tighten the right side, unless it crosses over the left one
+        if _cross(apex, right, portal_right) >= 0:
+            if apex == right or _cross(apex, left, portal_right) < 0:
+                right, right_index = portal_right, i
+            else:
+                points.append(left)
+                apex = right = left
+                apex_index = right_index = left_index
+                i = apex_index + 1
+                continue
+        if _cross(apex, left, portal_left) <= 0:
+            if apex == left or _cross(apex, right, portal_left) > 0:
+                left, left_index = portal_left, i
+            else:
+                points.append(right)
+                apex = left = right
+                apex_index = left_index = right_index
+                i = apex_index + 1
+                continue
+        i += 1
+    if points[-1] != goal:
+        points.append(goal)
+    return points
@@ -0,0 +1,113 @@
+from constructs.field.camera import Camera
+from constructs.field.walkmesh import Walkmesh
+from PIL import Image
+from utils.profiling import profiler
+import numpy as np
+
+# the grey WalkmeshFrame clears to, used when there is no MIM to render the tilemap with
+BACKGROUND = (51, 51, 51, 255)
+FILL = (64, 160, 255, 96)
+WIREFRAME = (255, 255, 255, 255)
+# covered pixels per batch of filled triangles, bounds the memory of a batch
+FILL_BATCH = 1 << 21
+
+def _blend(image, pixels, color, shades=None):
+    # alpha blend color, scaled by shades, over the flat pixel indices of image
+    flat = image.reshape(-1, 4)
+    rgb = np.asarray(color[:3], dtype=np.float32)
+    rgb = rgb if shades is None else shades[:, None] * rgb
+    alpha = color[3] / 255
+    flat[pixels, :3] = (flat[pixels, :3] * (1 - alpha) + rgb * alpha).astype(np.uint8)
+
+def _fill(image, screen, depth, shades, color):
+    """Z-buffered triangles, every pixel whose center is inside one, nearest one per pixel."""
+    height, width = image.shape[:2]
+    low = np.maximum(np.floor(screen.min(axis=1) - 0.5), 0).astype(np.int64)
+    high = np.minimum(np.ceil(screen.max(axis=1) - 0.5), [width - 1, height - 1]).astype(np.int64)
+    spans = np.maximum(high - low + 1, 0)
+    counts = spans[:, 0] * spans[:, 1]
+    # nearest first: 1 / depth grows towards the camera and is linear on the screen
+    nearest = np.full(width * height, -np.inf)
+    covered = np.full(width * height, -1, dtype=np.int64)
+    a, b, c = screen[:, 0], screen[:, 1], screen[:, 2]
+    area = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+    inverse = 1 / depth
+    counts[area == 0] = 0
+    drawn = np.flatnonzero(counts)
+    batches = (np.cumsum(counts[drawn]) - counts[drawn]) // FILL_BATCH
+    for triangles in np.split(drawn, np.flatnonzero(np.diff(batches)) + 1):
+        n = counts[triangles]
+        triangle = np.repeat(triangles, n)
+        local = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+        xs = low[triangle, 0] + local % spans[triangle, 0]
+        ys = low[triangle, 1] + local // spans[triangle, 0]
+        px, py = xs + 0.5, ys + 0.5
+        # barycentric weights of the pixel centers, the sign of the area takes care of the winding
+        u = ((c[triangle, 0] - b[triangle, 0]) * (py - b[triangle, 1])
+             - (c[triangle, 1] - b[triangle, 1]) * (px - b[triangle, 0])) / area[triangle]
+        v = ((a[triangle, 0] - c[triangle, 0]) * (py - c[triangle, 1])
+             - (a[triangle, 1] - c[triangle, 1]) * (px - c[triangle, 0])) / area[triangle]
+        w = 1 - u - v
+        inside = (u >= 0) & (v >= 0) & (w >= 0)
+        pixels = (ys * width + xs)[inside]
+        triangle = triangle[inside]
+        weights = inverse[triangle]
+        z = u[inside] * weights[:, 0] + v[inside] * weights[:, 1] + w[inside] * weights[:, 2]
+        order = np.lexsort((-z, pixels))
+        pixels, first = np.unique(pixels[order], return_index=True)
+        z, triangle = z[order][first], triangle[order][first]
+        closer = z > nearest[pixels]
+        nearest[pixels[closer]] = z[closer]
+        covered[pixels[closer]] = triangle[closer]
+    pixels = np.flatnonzero(covered >= 0)
+    _blend(image, pixels, color, shades[covered[pixels]])
+
+def _lines(image, starts, ends, color):
+    """Lines sampled once per pixel along their longest axis, clipped to the image."""
+    height, width = image.shape[:2]
+    lengths = np.ceil(np.abs(ends - starts).max(axis=1)).astype(np.int64)
+    # lines far off screen would be sampled for nothing
+    lengths = np.minimum(lengths, 4 * (width + height)) + 1
+    line = np.repeat(np.arange(len(starts)), lengths)
+    step = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    t = (step / np.maximum(lengths - 1, 1)[line])[:, None]
+    points = np.floor(starts[line] + t * (ends[line] - starts[line])).astype(np.int64)
+    inside = (points[:, 0] >= 0) & (points[:, 0] < width) & (points[:, 1] >= 0) & (points[:, 1] < height)
+    _blend(image, np.unique(points[inside, 1] * width + points[inside, 0]), color)
+
+def draw_walkmesh(image: np.ndarray, walkmesh: Walkmesh, camera: Camera, origin_x=0, origin_y=0,
+                  fill=FILL, wireframe=WIREFRAME):
+    """
+    Projects the walkmesh with the field camera and draws it into an (height, width, 4)
+    uint8 image whose top left pixel is screen position (origin_x, origin_y), like
+    Tilemap.get_image_data's. Filled triangles are shaded by how much they face the
+    camera and alpha blended, the wireframe is drawn over them without depth test.
+    Triangles with a corner behind the camera are left out. fill or wireframe may be None.
+    """
+    if walkmesh.nb_sectors == 0:
+        return image
+    with profiler.stage("preview.walkmesh", objects=walkmesh.nb_sectors):
+        screen, depth = camera.project(walkmesh.vertices.reshape(-1, 3))
+        screen = (screen - [origin_x, origin_y]).reshape(-1, 3, 2)
+        depth = depth.reshape(-1, 3)
+        visible = (depth > 0).all(axis=1) & np.isfinite(screen).all(axis=(1, 2))
+        screen, depth = screen[visible], depth[visible]
+        if fill is not None:
+            normals = walkmesh.normals()[visible]
+            view = np.array([camera.axis_z.x, camera.axis_z.y, camera.axis_z.z])
+            shades = (0.4 + 0.6 * np.abs(normals @ view)).astype(np.float32)
+            _fill(image, screen, depth, shades, fill)
+        if wireframe is not None:
+            _lines(image, screen.reshape(-1, 2), np.roll(screen, -1, axis=1).reshape(-1, 2), wireframe)
+    return image
+
+def render_preview(field, mim=None, fill=FILL, wireframe=WIREFRAME) -> Image.Image:
+    """The walkmesh over the field's background, or over a plain one without a MIM."""
+    tilemap = field.tilemap
+    if mim is None:
+        image = np.empty((tilemap.height, tilemap.width, 4), dtype=np.uint8)
+        image[...] = BACKGROUND
+    else:
+        image = np.array(tilemap.get_image_data(mim))
+    draw_walkmesh(image, field.walkmesh, field.camera, tilemap.origin_x, tilemap.origin_y, fill, wireframe)
+    return Image.fromarray(image)
@@ -1,21 +1,34 @@
 from construct import Adapter, Array,Byte, ExprAdapter, Padding, PaddedString, Pointer, RepeatUntil, Struct, Tell
 from construct import Int8ul, Int16ul, Int32ul, this
 from ..akao import AKAO, AKAOConstruct
-from ..opcodes import Opcode, FieldOpcodeConstruct
-from dataclasses import dataclass
+from ..opcodes import Opcode, FieldInstructionsConstruct
+from dataclasses import dataclass, field
 from typing import List
 from utils.ff7text import FF7Text
+from utils.profiling import Timed
 
 @dataclass
 class EntityScript:
     address: int
     instructions: List[Opcode]
 
+    def dump(self) -> dict:
+        return {
+            "address": self.address,
+            "instructions": [i.dump() for i in self.instructions]
+        }
+
 @dataclass
 class Entity:
     name: str
     scripts: List[EntityScript]
 
+    def dump(self) -> dict:
+        return {
+            "name": self.name,
+            "scripts": [s.dump() for s in self.scripts]
+        }
+
 @dataclass
 class Script:
     scale: int
@@ -24,6 +37,18 @@ class Script:
     akaos: List[AKAO]
     entities: List[Entity]
     dialogs: List[str]
+    # entity script offsets and instructions referenced vs actually decoded
+    decode_stats: dict = field(default_factory=dict, compare=False, repr=False)
+
+    def dump(self) -> dict:
+        return {
+            "scale": self.scale,
+            "creator": self.creator,
+            "name": self.name,
+            "akaos": [a.dump() for a in self.akaos],
+            "entities": [e.dump() for e in self.entities],
+            "dialogs": self.dialogs
+        }
 
 class ScriptAdapter(Adapter):
     def _decode(self, obj, context, path):
@@ -41,10 +66,11 @@ class ScriptAdapter(Adapter):
             ],
             dialogs=[
                 e for e in obj.dialogs.entries
-            ]
+            ],
+            decode_stats=FieldInstructionsConstruct.memo(context).stats()
         )
 
-ScriptConstruct = ScriptAdapter(Struct(
+ScriptHeaderFields = [
     "start" / Tell,
     Padding(2),
     "nbEntities" / Int8ul,
@@ -55,6 +81,12 @@ ScriptConstruct = ScriptAdapter(Struct(
     Padding(6),
     "creator" / PaddedString(8, 'ascii'),
     "name" / PaddedString(8, 'ascii'),
+]
+
+ScriptHeaderConstruct = Struct(*ScriptHeaderFields)
+
+ScriptConstruct = ScriptAdapter(Struct(
+    *ScriptHeaderFields,
     "entities" / Array(
         this.nbEntities,
         PaddedString(8, 'ascii')
@@ -63,7 +95,7 @@ ScriptConstruct = ScriptAdapter(Struct(
         this.nbAKAOOffsets,
         Struct(
             "offset" / Int32ul,
-            "AKAO" / Pointer(lambda ctx: ctx.offset + ctx._.start,AKAOConstruct)
+            "AKAO" / Pointer(lambda ctx: ctx.offset + ctx._.start,Timed("akao", AKAOConstruct))
         )
     ),
     "entityScripts" / Array(
@@ -71,10 +103,7 @@ ScriptConstruct = ScriptAdapter(Struct(
             32,
             Struct(
                 "offset" / Int16ul,
-                "instructions" / Pointer(
-                    lambda ctx: ctx.offset + ctx._.start,
-                    RepeatUntil(lambda obj, lst, ctx: obj.id == 0, FieldOpcodeConstruct)
-                )
+                "instructions" / Pointer(lambda ctx: ctx.offset + ctx._.start, FieldInstructionsConstruct)
             )
         )
     ),
@@ -101,5 +130,3 @@ ScriptConstruct = ScriptAdapter(Struct(
         )
     )
 ))
-
-ScriptConstruct.compile()
\ No newline at end of file
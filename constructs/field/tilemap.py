@@ -3,7 +3,9 @@ from construct import Int8ul, Int16ul, Int16sl, Int32ul, BitsInteger, this
 from enum import IntEnum
 from dataclasses import dataclass
 from ..mim import MIM
-from PIL import Image, ImagePalette, ImageChops
+from utils.profiling import profiler
+import numpy as np
+from PIL import Image
 from typing import List
 
 @dataclass
@@ -39,34 +41,68 @@ class Tilemap:
     sprite_tiles: List[TileInfo]
     extra_tiles: List[TileInfo]
 
+    def _get_tiles_rgba(self, mim: MIM, tiles: List[TileInfo]):
+        with profiler.stage("tilemap.tiles", objects=len(tiles)) as record:
+            rgba = mim.get_tiles_rgba(
+                [t.clut_number for t in tiles],
+                [t.tp_blend.page_x for t in tiles],
+                [t.tp_blend.page_y for t in tiles],
+                [t.tex_page_source_x for t in tiles],
+                [t.tex_page_source_y for t in tiles],
+                depths=[t.tp_blend.depth for t in tiles]
+            )
+            record["bytes"] = rgba.nbytes
+        return rgba
+
+    def _paste(self, img, tiles: List[TileInfo], rgba):
+        # masked paste of a run of tiles, where a later opaque texel overwrites an earlier one
+        ys = np.array([t.destination_y - self.origin_y for t in tiles])[:, None, None] + np.arange(16)[None, :, None]
+        xs = np.array([t.destination_x - self.origin_x for t in tiles])[:, None, None] + np.arange(16)[None, None, :]
+        mask = (rgba[..., 3] != 0) & (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        pixels = (ys * self.width + xs)[mask]
+        colors = rgba[mask]
+        pixels, last = np.unique(pixels[::-1], return_index=True)
+        img.reshape(-1, 4)[pixels] = colors[len(colors) - 1 - last]
+
     def get_image_data(self, mim: MIM):
-        img = Image.new(mode="RGBA",size=(self.width,self.height),color=(0,0,0,255))
+        with profiler.stage("tilemap.render", bytes=self.width * self.height * 4):
+            return self._render(mim)
+
+    def _render(self, mim: MIM):
+        img = np.zeros((self.height, self.width, 4), dtype=np.uint8)
+        img[..., 3] = 255
         # draw background
-        for t in self.background_tiles:
-            tpi = t.tp_blend
-            tileimg = mim.get_tile_data(t.clut_number, tpi.page_x, tpi.page_y, t.tex_page_source_x, t.tex_page_source_y)
-            dest_x = t.destination_x - self.origin_x
-            dest_y = t.destination_y - self.origin_y
-            img.paste(tileimg,(dest_x,dest_y), tileimg)
-        # draw sprites
-        for t in self.sprite_tiles:
-            tpi = t.tp_blend
-            tileimg = mim.get_tile_data(t.clut_number, tpi.page_x, tpi.page_y, t.tex_page_source_x, t.tex_page_source_y)
-            dest_x = t.destination_x - self.origin_x
-            dest_y = t.destination_y - self.origin_y
-            if t.parameter_blend == 1:
-                src_tile = img.crop((dest_x, dest_y, dest_x + 16, dest_y + 16))
-                if tpi.blending_mode in (1, 3):
-                    blended = ImageChops.add(src_tile, tileimg)
-                elif tpi.blending_mode == 2:
-                    blended = ImageChops.subtract(src_tile, tileimg)
-                img.paste(blended,(dest_x, dest_y))
-                del src_tile
-                del blended
-            else:
-                img.paste(tileimg,(dest_x,dest_y), tileimg)
-            del tileimg
-        return img
+        if self.background_tiles:
+            self._paste(img, self.background_tiles, self._get_tiles_rgba(mim, self.background_tiles))
+        # draw sprites, runs of masked tiles at once and blended tiles in order
+        if self.sprite_tiles:
+            rgba = self._get_tiles_rgba(mim, self.sprite_tiles)
+            start = 0
+            while start < len(self.sprite_tiles):
+                t = self.sprite_tiles[start]
+                if t.parameter_blend != 1:
+                    end = start + 1
+                    while end < len(self.sprite_tiles) and self.sprite_tiles[end].parameter_blend != 1:
+                        end += 1
+                    self._paste(img, self.sprite_tiles[start:end], rgba[start:end])
+                    start = end
+                    continue
+                dest_x = t.destination_x - self.origin_x
+                dest_y = t.destination_y - self.origin_y
+                src_tile = img[dest_y:dest_y + 16, dest_x:dest_x + 16].astype(np.int16)
+                tile = rgba[start, :src_tile.shape[0], :src_tile.shape[1]]
+                if t.tp_blend.blending_mode in (1, 3):
+                    blended = src_tile + tile
+                elif t.tp_blend.blending_mode == 2:
+                    blended = src_tile - tile
+                else:
+                    # average of the colors under the opaque texels, the destination alpha stays
+                    blended = src_tile.copy()
+                    opaque = tile[..., 3] != 0
+                    blended[..., :3][opaque] = (src_tile[..., :3][opaque] + tile[..., :3][opaque]) >> 1
+                img[dest_y:dest_y + 16, dest_x:dest_x + 16] = np.clip(blended, 0, 255)
+                start += 1
+        return Image.fromarray(img)
 
 class TilemapAdapter(Adapter):
     def _decode(self, obj, context, path):
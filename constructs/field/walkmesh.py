@@ -1,8 +1,13 @@
-from construct import Adapter, Array, Padding, Struct
-from construct import Int16ul, Int16sl, Int32ul, this
-from dataclasses import dataclass
+from construct import Adapter, Bytes, Struct
+from construct import Int32ul, this
+from dataclasses import dataclass, field
 from globals import Vertex3
-from typing import List
+from math import sqrt
+from typing import List, Optional
+import numpy as np
+
+# no walkable triangle across this edge
+NO_ACCESS = 0xFFFF
 
 @dataclass
 class Access:
@@ -16,49 +21,250 @@ class Triangle:
     vertices: List[Vertex3]
     access: List[Access]
 
-@dataclass
+@dataclass(eq=False)
 class Walkmesh:
+    """
+    Sectors as packed arrays over the section data: vertices is (nb_sectors, 3, 3) int16
+    x/y/z, access is (nb_sectors, 3) uint16 with the triangle across edges v0-v1, v1-v2, v2-v0.
+    """
     nb_sectors: int
-    triangles: List[Triangle]
+    vertices: np.ndarray
+    access: np.ndarray
+    _triangles: Optional[List[Triangle]] = field(default=None, init=False, repr=False)
+    _grid: Optional["WalkmeshGrid"] = field(default=None, init=False, repr=False)
+    _graph: Optional["WalkmeshGraph"] = field(default=None, init=False, repr=False)
+
+    @property
+    def triangles(self) -> List[Triangle]:
+        # built on first access only, bulk work should go through the arrays
+        if self._triangles is None:
+            triangles = []
+            for i, (corners, access) in enumerate(zip(self.vertices.tolist(), self.access.tolist())):
+                vertices = [Vertex3(x, y, z) for x, y, z in corners]
+                triangles.append(Triangle(id=i, vertices=vertices, access=[
+                    Access(vertices[0], vertices[1], access[0]),
+                    Access(vertices[1], vertices[2], access[1]),
+                    Access(vertices[2], vertices[0], access[2])
+                ]))
+            self._triangles = triangles
+        return self._triangles
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Walkmesh):
+            return NotImplemented
+        return (self.nb_sectors == other.nb_sectors and np.array_equal(self.vertices, other.vertices)
+                and np.array_equal(self.access, other.access))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_triangles"] = None
+        state["_grid"] = None
+        state["_graph"] = None
+        return state
+
+    @property
+    def grid(self) -> "WalkmeshGrid":
+        """Spatial index of the triangles, built on first use."""
+        if self._grid is None:
+            self._grid = WalkmeshGrid(self)
+        return self._grid
+
+    @property
+    def graph(self) -> "WalkmeshGraph":
+        """Access graph for path-finding, built on first use with its components."""
+        if self._graph is None:
+            # navigation builds on this module
+            from constructs.field.navigation import WalkmeshGraph
+            self._graph = WalkmeshGraph(self)
+        return self._graph
+
+    def bounds(self):
+        """(min, max) x/y/z over all vertices."""
+        points = self.vertices.reshape(-1, 3)
+        return points.min(axis=0), points.max(axis=0)
+
+    def normals(self) -> np.ndarray:
+        """Unit normals of the triangles, as (nb_sectors, 3) floats."""
+        corners = self.vertices.astype(np.float64)
+        normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+        lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+        return np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+
+    def to_obj(self) -> str:
+        lines = [f"v {x} {y} {z}" for x, y, z in self.vertices.reshape(-1, 3).tolist()]
+        lines.extend(f"f {3 * i + 1} {3 * i + 2} {3 * i + 3}" for i in range(self.nb_sectors))
+        return "\n".join(lines) + "\n"
+
+class WalkmeshGrid:
+    """
+    Uniform grid over the ground plane (x, y, z being the height), each cell listing
+    the triangles whose bounding box overlaps it. Queries take arrays of points or
+    rays and return triangle ids, matching Triangle.id, with -1 for no triangle.
+    """
+    EPSILON = 1e-9
+
+    def __init__(self, walkmesh: Walkmesh, cell_size: Optional[float] = None):
+        corners = walkmesh.vertices.astype(np.float64)
+        self.corners = corners
+        self.origin = corners[:, 0]
+        self.edge1 = corners[:, 1] - corners[:, 0]
+        self.edge2 = corners[:, 2] - corners[:, 0]
+        # 2D determinant of the edges, for barycentric coordinates on the ground plane
+        self.det = self.edge1[:, 0] * self.edge2[:, 1] - self.edge1[:, 1] * self.edge2[:, 0]
+        count = len(corners)
+        ground = corners[:, :, :2]
+        low, high = ground.min(axis=1), ground.max(axis=1)
+        self.low = low.min(axis=0) if count else np.zeros(2)
+        self.high = high.max(axis=0) if count else np.zeros(2)
+        self.bottom = corners[:, :, 2].min() if count else 0.0
+        self.top = corners[:, :, 2].max() if count else 0.0
+        extent = self.high - self.low
+        if cell_size is None:
+            # about two triangles per cell
+            cell_size = max(sqrt(extent[0] * extent[1] * 2 / max(count, 1)), 1.0)
+        self.cell_size = cell_size
+        self.columns, self.rows = (np.floor(extent / cell_size).astype(np.int64) + 1).tolist()
+        first = np.floor((low - self.low) / cell_size).astype(np.int64)
+        spans = np.floor((high - self.low) / cell_size).astype(np.int64) - first + 1
+        counts = spans[:, 0] * spans[:, 1]
+        triangles = np.repeat(np.arange(count), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cells = ((first[triangles, 1] + local // spans[triangles, 0]) * self.columns
+                 + first[triangles, 0] + local % spans[triangles, 0])
+        order = np.argsort(cells, kind="stable")
+        # CSR layout: the triangles of cell c are cell_triangles[cell_start[c]:cell_start[c + 1]], by id
+        self.cell_triangles = triangles[order]
+        self.cell_start = np.searchsorted(cells[order], np.arange(self.columns * self.rows + 1))
+
+    def cells(self, points) -> np.ndarray:
+        """Cell index of each (x, y) point, -1 outside the grid."""
+        coords = np.floor((points - self.low) / self.cell_size).astype(np.int64)
+        inside = (coords >= 0).all(axis=1) & (coords[:, 0] < self.columns) & (coords[:, 1] < self.rows)
+        return np.where(inside, coords[:, 1] * self.columns + coords[:, 0], -1)
+
+    def _barycentric(self, points, triangles):
+        offset = points - self.origin[triangles, :2]
+        det = self.det[triangles]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            u = (offset[:, 0] * self.edge2[triangles, 1] - offset[:, 1] * self.edge2[triangles, 0]) / det
+            v = (self.edge1[triangles, 0] * offset[:, 1] - self.edge1[triangles, 1] * offset[:, 0]) / det
+        return u, v
+
+    def locate(self, points):
+        """
+        Triangle under each (x, y) point, the lowest id where triangles overlap.
+        Returns the ids and the (u, v) barycentric coordinates along edges v0-v1 and v0-v2.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        cells = self.cells(points)
+        starts = np.where(cells >= 0, self.cell_start[cells], 0)
+        counts = np.where(cells >= 0, self.cell_start[cells + 1] - starts, 0)
+        queries = np.repeat(np.arange(len(points)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        candidates = self.cell_triangles[np.repeat(starts, counts) + local]
+        u, v = self._barycentric(points[queries], candidates)
+        eps = WalkmeshGrid.EPSILON
+        hit = (u >= -eps) & (v >= -eps) & (u + v <= 1 + eps)
+        found, first = np.unique(queries[hit], return_index=True)
+        ids = np.full(len(points), -1, dtype=np.int64)
+        ids[found] = candidates[hit][first]
+        coords = np.full((len(points), 2), np.nan)
+        coords[found, 0] = u[hit][first]
+        coords[found, 1] = v[hit][first]
+        return ids, coords
+
+    def heights(self, points):
+        """Triangle ids and interpolated heights of (x, y) points, heights are NaN off the mesh."""
+        ids, coords = self.locate(points)
+        heights = np.full(len(ids), np.nan)
+        found = ids >= 0
+        triangles = ids[found]
+        heights[found] = (self.origin[triangles, 2] + coords[found, 0] * self.edge1[triangles, 2]
+                          + coords[found, 1] * self.edge2[triangles, 2])
+        return ids, heights
+
+    def _candidates(self, start, end):
+        # triangles in the cells along a ground segment, stepping half a cell at a time
+        # and taking the up to 2x2 cells around each step
+        steps = int(np.ceil(np.abs(end - start).max() * 2 / self.cell_size)) + 1
+        points = start + np.linspace(0.0, 1.0, steps + 1)[:, None] * (end - start)
+        coords = np.floor((points - self.low) / self.cell_size).astype(np.int64)
+        low = np.minimum(coords[:-1], coords[1:])
+        high = np.maximum(coords[:-1], coords[1:])
+        xs = np.concatenate([low[:, 0], high[:, 0], low[:, 0], high[:, 0]])
+        ys = np.concatenate([low[:, 1], low[:, 1], high[:, 1], high[:, 1]])
+        inside = (xs >= 0) & (xs < self.columns) & (ys >= 0) & (ys < self.rows)
+        cells = np.unique(ys[inside] * self.columns + xs[inside])
+        starts = self.cell_start[cells]
+        counts = self.cell_start[cells + 1] - starts
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return np.unique(self.cell_triangles[np.repeat(starts, counts) + local])
+
+    def raycast(self, origins, directions, max_t=np.inf):
+        """
+        First triangle hit by each 3D ray origin + t * direction with 0 <= t <= max_t,
+        one direction may be given for all origins. Returns the ids and t, inf for rays that miss.
+        """
+        origins, directions = np.broadcast_arrays(np.asarray(origins, dtype=np.float64).reshape(-1, 3),
+                                                  np.asarray(directions, dtype=np.float64).reshape(-1, 3))
+        ids = np.full(len(origins), -1, dtype=np.int64)
+        distances = np.full(len(origins), np.inf)
+        eps = WalkmeshGrid.EPSILON
+        low, high = np.append(self.low, self.bottom), np.append(self.high, self.top)
+        for r, (origin, direction) in enumerate(zip(origins, directions)):
+            # clip the ray to the bounding box of the mesh
+            t0, t1 = 0.0, max_t
+            for axis in range(3):
+                if abs(direction[axis]) < eps:
+                    if not low[axis] <= origin[axis] <= high[axis]:
+                        t0, t1 = 1.0, 0.0
+                else:
+                    a = (low[axis] - origin[axis]) / direction[axis]
+                    b = (high[axis] - origin[axis]) / direction[axis]
+                    t0, t1 = max(t0, min(a, b)), min(t1, max(a, b))
+            if t0 > t1 or not np.isfinite(t1):
+                continue
+            triangles = self._candidates(origin[:2] + t0 * direction[:2], origin[:2] + t1 * direction[:2])
+            if len(triangles) == 0:
+                continue
+            # Moller-Trumbore against every candidate
+            edge1, edge2 = self.edge1[triangles], self.edge2[triangles]
+            p = np.cross(direction, edge2)
+            det = (edge1 * p).sum(axis=1)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                inverse = 1.0 / det
+                offset = origin - self.origin[triangles]
+                u = (offset * p).sum(axis=1) * inverse
+                q = np.cross(offset, edge1)
+                v = (q * direction).sum(axis=1) * inverse
+                t = (q * edge2).sum(axis=1) * inverse
+            hit = ((np.abs(det) > eps) & (u >= -eps) & (v >= -eps) & (u + v <= 1 + eps)
+                   & (t >= 0) & (t <= max_t))
+            if hit.any():
+                best = np.argmin(np.where(hit, t, np.inf))
+                ids[r] = triangles[best]
+                distances[r] = t[best]
+        return ids, distances
+
+    def segments(self, starts, ends):
+        """First triangle crossed by each 3D segment, t being the fraction of the segment."""
+        starts = np.asarray(starts, dtype=np.float64).reshape(-1, 3)
+        return self.raycast(starts, np.asarray(ends, dtype=np.float64).reshape(-1, 3) - starts, 1.0)
 
 class WalkmeshAdapter(Adapter):
     def _decode(self, obj, context, path):
-        triangles = []
-        for i in range(obj.nb_sectors):
-            vertices = [Vertex3(x = t.x, y=t.y, z=t.z) for t in obj.sector_pool[i]]
-            access = [
-                Access(vertices[0], vertices[1],obj.access_pool[i].access1),
-                Access(vertices[1], vertices[2],obj.access_pool[i].access2),
-                Access(vertices[2], vertices[0],obj.access_pool[i].access3)
-            ]
-            triangles.append(Triangle(id=i, vertices=vertices, access=access))
+        # x, y, z and padding per vertex: the vertex array is a strided view that skips the padding
+        sectors = np.frombuffer(obj.sector_pool, dtype="<i2").reshape(obj.nb_sectors, 3, 4)
         return Walkmesh(
             nb_sectors=obj.nb_sectors,
-            triangles=triangles
+            vertices=sectors[:, :, :3],
+            access=np.frombuffer(obj.access_pool, dtype="<u2").reshape(obj.nb_sectors, 3)
         )
 
 WalkmeshConstruct = WalkmeshAdapter(Struct(
     "nb_sectors" / Int32ul,
-    "sector_pool" / Array(
-        this.nb_sectors,
-        "triangle" / Array(
-            3,
-            Struct(
-                "x" / Int16sl,
-                "y" / Int16sl,
-                "z" / Int16sl,
-                Padding(2)
-            )
-        )
-    ),
-    "access_pool" / Array(
-        this.nb_sectors,
-        Struct(
-            "access1" / Int16ul,
-            "access2" / Int16ul,
-            "access3" / Int16ul
-        )
-    )
+    # 3 vertices of x, y, z int16 and 2 padding bytes
+    "sector_pool" / Bytes(this.nb_sectors * 24),
+    # 3 uint16 triangle ids
+    "access_pool" / Bytes(this.nb_sectors * 6)
 ))
-
-WalkmeshConstruct.compile()
\ No newline at end of file
@@ -1,10 +1,18 @@
-from construct import Adapter, Array,BitsInteger,BitStruct, ByteSwapped, ExprAdapter, Flag, GreedyRange, Struct
-from construct import Int8ul, Int16ul, Int32ul, this
+from array import array
+from collections import OrderedDict, namedtuple
+from construct import Adapter, Bytes, ExprAdapter, Flag, GreedyRange, Struct
+from construct import Int8ul, Int16ul, Int32ul
 from dataclasses import dataclass, field
-from globals import lzs
+import numpy as np
 from PIL import Image
 from PIL import ImagePalette
+from sys import byteorder
 from typing import List, Optional
+import os
+from utils.lzs import LZS
+from utils.profiling import profiler
+from .compiled import compiled
+from .vram import VRAM
 
 @dataclass
 class PaletteEntry:
@@ -35,6 +43,14 @@ class Palette:
                 alpha_mask[i] = 0 if self.entries[i].stp else 255
         return bytes(alpha_mask)
 
+    def getRGBALookup(self):
+        # 256 RGBA entries with the alpha mask applied, unused entries transparent black
+        alpha_mask = self.getAlphaMasks()
+        lookup = bytearray(256 * 4)
+        for i, e in enumerate(self.entries[:256]):
+            lookup[i * 4:i * 4 + 4] = (e.red, e.green, e.blue, alpha_mask[i])
+        return bytes(lookup)
+
 @dataclass
 class CLUT:
     x: int
@@ -42,6 +58,10 @@ class CLUT:
     width: int
     height: int
     palettes: List[Palette]
+    lookups: List[bytes] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.lookups = [p.getRGBALookup() for p in self.palettes]
 
 @dataclass
 class Texture:
@@ -49,61 +69,144 @@ class Texture:
     y: int
     width: int
     height: int
-    data: List[int]
+    # 16-bit VRAM words, a view over the raw little-endian bytes
+    data: memoryview
+
+    @staticmethod
+    def words(raw) -> memoryview:
+        if byteorder == 'big':
+            words = array('H', raw)
+            words.byteswap()
+            return memoryview(words)
+        return memoryview(raw).cast('H')
+
+    @property
+    def raw(self) -> memoryview:
+        if byteorder == 'big':
+            words = array('H', self.data)
+            words.byteswap()
+            return memoryview(words).cast('B')
+        return self.data.cast('B')
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["data"] = self.raw.tobytes()
+        return state
+
+    def __setstate__(self, state):
+        state["data"] = Texture.words(state["data"])
+        self.__dict__.update(state)
+
+TileCacheInfo = namedtuple("TileCacheInfo", ["hits", "misses", "maxsize", "currsize"])
 
 class MIM:
-    def __init__(self, clut: CLUT, textures: List[Texture]):
+    def __init__(self, clut: CLUT, textures: List[Texture], tile_cache_size=4096, image_cache_size=8):
         self.clut = clut
         self.textures= textures
-        self.tkimg = None
+        # full VRAM renders keyed by palette, least recently used first
+        self.image_cache = OrderedDict()
+        self.image_cache_size = image_cache_size
+        # decoded RGBA tiles keyed by (palette, page_x, page_y, source_x, source_y, depth, width, height)
+        self.tile_cache = OrderedDict()
+        self.tile_cache_size = tile_cache_size
+        self.tile_cache_hits = 0
+        self.tile_cache_misses = 0
+        self._vram = None
+
+    @property
+    def vram(self) -> VRAM:
+        if self._vram is None:
+            self._vram = VRAM.from_mim(self)
+        return self._vram
 
     @classmethod
     def from_file(cls, path: str):
-        stream = lzs.un_lzs(path)
-        mim = MIMConstruct.parse_stream(stream)
+        with profiler.stage("lzs.decompress", input_bytes=os.path.getsize(path)) as record:
+            stream = LZS.un_lzs(path)
+            record["bytes"] = stream.getbuffer().nbytes
+        with profiler.stage("mim.parse", bytes=stream.getbuffer().nbytes) as record:
+            mim = compiled(MIMConstruct).parse_stream(stream)
+            record["objects"] = len(mim.clut.palettes) + len(mim.textures)
         return cls(mim.clut, mim.textures)
 
-    def get_tile_data(self, palette_id, page_x, page_y, tex_source_x, tex_source_y, width=8, height=16):
-        pal = self.clut.palettes[palette_id].getImagePalette()
-        transparency = self.clut.palettes[palette_id].getAlphaMasks()
-        texture = self.textures[page_y]
-        data = []
-        for y in range(height):
-            source_y = tex_source_y + y
-            source_x = (tex_source_x >> 1) + ((page_x * 64) - texture.x)
-            offset = (source_y * texture.width) + source_x
-            data.extend([b for value in texture.data[offset:offset + width] for b in value.to_bytes(2, byteorder='little')])
-        tileimg = Image.frombytes(mode="P", size=(width*2, height), data=bytes(data))
-        tileimg.putpalette(pal)
-        if transparency is not None:
-            tileimg.info["transparency"] = transparency
-        result = tileimg.convert("RGBA")
-        return result
+    def tile_cache_info(self) -> TileCacheInfo:
+        return TileCacheInfo(self.tile_cache_hits, self.tile_cache_misses, self.tile_cache_size, len(self.tile_cache))
+
+    def tile_cache_clear(self):
+        self.tile_cache.clear()
+        self.tile_cache_hits = 0
+        self.tile_cache_misses = 0
+
+    def get_tile_data(self, palette_id, page_x, page_y, tex_source_x, tex_source_y, width=8, height=16, depth=1):
+        tile = self.get_tiles_rgba([palette_id], [page_x], [page_y], [tex_source_x], [tex_source_y], width, height, [depth])[0]
+        return Image.fromarray(tile)
+
+    def get_tiles_rgba(self, palette_ids, page_xs, page_ys, tex_source_xs, tex_source_ys, width=8, height=16, depths=None):
+        """
+        Batched get_tile_data, returning a (tiles, height, width*2, 4) RGBA array.
+        Texture pages are 8-bit unless depths are given (0: 4-bit, 1: 8-bit, 2: 15-bit).
+        Tiles are served from the LRU tile cache, the missing ones are decoded together.
+        """
+        if depths is None:
+            depths = [1] * len(palette_ids)
+        keys = [(int(p), int(px), int(py), int(sx), int(sy), int(d), width, height)
+                for p, px, py, sx, sy, d in zip(palette_ids, page_xs, page_ys, tex_source_xs, tex_source_ys, depths)]
+        tiles = {}
+        missing = []
+        for key in keys:
+            if key in tiles:
+                self.tile_cache_hits += 1
+            elif key in self.tile_cache:
+                self.tile_cache.move_to_end(key)
+                tiles[key] = self.tile_cache[key]
+                self.tile_cache_hits += 1
+            else:
+                tiles[key] = None
+                missing.append(key)
+                self.tile_cache_misses += 1
+        if missing:
+            palettes, page_xs, page_ys, us, vs, depths = zip(*[k[:6] for k in missing])
+            decoded = self.vram.sample_tiles(palettes, page_xs, page_ys, depths, us, vs, width=width * 2, height=height)
+            for key, tile in zip(missing, decoded):
+                # a copy of its own, a view would keep the whole batch alive until its last tile is evicted
+                tile = tile.copy()
+                tile.flags.writeable = False
+                tiles[key] = tile
+                self.tile_cache[key] = tile
+            while len(self.tile_cache) > self.tile_cache_size:
+                self.tile_cache.popitem(last=False)
+        if not keys:
+            return np.zeros((0, height, width * 2, 4), dtype=np.uint8)
+        return np.stack([tiles[k] for k in keys])
+
+    def get_clut_image(self):
+        # the palettes as opaque RGB, one row per palette
+        lookups = np.frombuffer(b"".join(self.clut.lookups), dtype=np.uint8).reshape(-1, 256, 4)
+        strip = lookups[:self.clut.height, :self.clut.width].copy()
+        strip[..., 3] = 255
+        return Image.fromarray(strip)
 
     def get_image_data(self, palette_id=0):
-        if self.tkimg is None:
-            pal = self.clut.palettes[palette_id].getImagePalette()
-            img = Image.new(mode="RGBA",size=(1024,512),color=(0,0,0,255))
-            for y in range(self.clut.height):
-                for x in range(self.clut.width):
-                    color = tuple(self.clut.palettes[y].entries[x].getColorData())
-                    img.putpixel((self.clut.x + x, self.clut.y + y),color)
-            for t in self.textures:
-                data = bytes([byte for value in t.data for byte in value.to_bytes(2, byteorder='little')])
-                ti = Image.frombytes(mode="P", size=(t.width*2,t.height),data=data)
-                ti.putpalette(pal)
-                transparency = self.clut.palettes[palette_id].getAlphaMasks()
-                if transparency is not None:
-                    ti.info["transparency"] = transparency
-                overlay = ti.convert("RGBA")
-                img.paste(overlay,(t.x*2, t.y), overlay)
-                del ti
-                del overlay
-            self.tkimg = img
-        return self.tkimg
+        if palette_id in self.image_cache:
+            self.image_cache.move_to_end(palette_id)
+            return self.image_cache[palette_id]
+        img = Image.new(mode="RGBA",size=(1024,512),color=(0,0,0,255))
+        img.paste(self.get_clut_image(), (self.clut.x, self.clut.y))
+        for t in self.textures:
+            ti = Image.frombytes(mode="P", size=(t.width*2,t.height),data=t.raw)
+            ti.putpalette(self.clut.lookups[palette_id], rawmode="RGBA")
+            overlay = ti.convert("RGBA")
+            img.paste(overlay,(t.x*2, t.y), overlay)
+            del ti
+            del overlay
+        self.image_cache[palette_id] = img
+        while len(self.image_cache) > self.image_cache_size:
+            self.image_cache.popitem(last=False)
+        return img
 
 class CLUTAdapter(Adapter):
     def _decode(self, obj, context, path):
+        colors = Texture.words(obj.palettes)
         return CLUT(
             x=obj.x,
             y=obj.y,
@@ -114,13 +217,13 @@ class CLUTAdapter(Adapter):
                     width=obj.width,
                     entries=[
                         PaletteEntry(
-                            stp = e.stp > 0,
-                            blue = (e.blue << 3) + (e.blue >> 2),
-                            green = (e.green << 3) + (e.green >> 2),
-                            red = (e.red << 3) + (e.red >> 2)
-                        ) for e in p
+                            stp = c >> 15 > 0,
+                            blue = (((c >> 10) & 0x1F) << 3) + (((c >> 10) & 0x1F) >> 2),
+                            green = (((c >> 5) & 0x1F) << 3) + (((c >> 5) & 0x1F) >> 2),
+                            red = ((c & 0x1F) << 3) + ((c & 0x1F) >> 2)
+                        ) for c in colors[p * obj.width:(p + 1) * obj.width]
                     ]
-                ) for p in obj.palettes
+                ) for p in range(obj.height)
             ]
         )
 
@@ -131,7 +234,7 @@ class TextureAdapter(Adapter):
             y=obj.y,
             width=obj.width,
             height=obj.height,
-            data=obj.data
+            data=Texture.words(obj.data)
         )
 
 CLUTConstruct = CLUTAdapter(Struct(
@@ -140,18 +243,8 @@ CLUTConstruct = CLUTAdapter(Struct(
     "y" / Int16ul,
     "width" / Int16ul,
     "height" / Int16ul,
-    "palettes" / Array(
-        this.height,
-        "palette" / Array(
-            this.width,
-            "color"/ ByteSwapped(BitStruct(
-                "stp" / BitsInteger(1),
-                "blue" / BitsInteger(5),
-                "green" / BitsInteger(5),
-                "red" / BitsInteger(5),
-            ))
-        )
-    )
+    # rows of 16-bit colors: stp, blue, green, red from the high bit down
+    "palettes" / Bytes(lambda ctx: ctx.width * ctx.height * 2)
 ))
 
 TextureConstruct = TextureAdapter(Struct(
@@ -160,17 +253,10 @@ TextureConstruct = TextureAdapter(Struct(
     "y" / Int16ul,
     "width" / Int16ul,
     "height" / Int16ul,
-    "data" / Array(
-        lambda ctx: ctx.width * ctx.height,
-        Int16ul
-    )
+    "data" / Bytes(lambda ctx: ctx.width * ctx.height * 2)
 ))
 
 MIMConstruct = Struct(
     "clut" / CLUTConstruct,
     "textures" / GreedyRange(TextureConstruct)
 )
-
-CLUTConstruct.compile()
-TextureConstruct.compile()
-MIMConstruct.compile()
\ No newline at end of file
@@ -1,17 +1,43 @@
 from construct import (
-    Adapter, BitStruct, BitsInteger, Byte, Bytewise, Bytes, Computed, ExprAdapter, Struct
+    Adapter, BitStruct, BitsInteger, Byte, Bytewise, Bytes, Computed, Construct, ExprAdapter, SizeofError, StreamError, Struct
 )
 from construct import Int8ul, Int8sl, Int16ul, Int16sl, Int32ul, Int32sl, this
 from dataclasses import dataclass, field
 from json import load
+from os.path import abspath, dirname, join
+from re import fullmatch
+from struct import Struct as Packer
 from typing import List, Optional
 
+# the opcode tables live at the repository root
+OPCODES_DIRECTORY = dirname(dirname(abspath(__file__)))
+
+# struct format, size in bits and signedness of the Bytewise integers used by the JSON tables
+BYTEWISE_FORMATS = {
+    "Int8ul": ("B", 8, False), "Int8sl": ("b", 8, True),
+    "Int16ul": ("H", 16, False), "Int16sl": ("h", 16, True),
+    "Int32ul": ("I", 32, False), "Int32sl": ("i", 32, True),
+}
+
 @dataclass
 class OperandTemplate:
     name: str
     description: str
     size: str
 
+    def format(self, opcode=None):
+        """
+        (struct format or None for bit fields, size in bits, signed) of the size string,
+        opcode names the operand's opcode in the error about a size string it can't read.
+        """
+        bytewise = fullmatch(r"Bytewise\((\w+)\)", self.size)
+        if bytewise and bytewise.group(1) in BYTEWISE_FORMATS:
+            return BYTEWISE_FORMATS[bytewise.group(1)]
+        bits = fullmatch(r"BitsInteger\((\d+)\)", self.size)
+        if bits is None:
+            raise ValueError(f"Unknown size {self.size!r} for operand {self.name!r} of opcode {opcode!r}")
+        return (None, int(bits.group(1)), False)
+
 @dataclass
 class OpcodeTemplate:
     id: int
@@ -19,25 +45,30 @@ class OpcodeTemplate:
     longname: str
     description: str
     operands: List[OperandTemplate] = field(default_factory=list)
-    bitstruct: BitStruct = field(init=False, repr=False)
+    _bitstruct: Optional[BitStruct] = field(default=None, init=False, repr=False, compare=False)
 
-    def __post_init__(self):
-        # Build a BitStruct from the operand templates
-        if self.operands:
+    @property
+    def bitstruct(self) -> BitStruct:
+        # Built and compiled from the operand templates on first use
+        if self._bitstruct is None:
             fields = []
             for op in self.operands:
                 # Use eval to turn "BitsInteger(8)" into an actual construct
                 fields.append(op.name / eval(op.size))
-            self.bitstruct = BitStruct(*fields)
-            self.bitstruct.compile()
-        else:
-            self.bitstruct = BitStruct()
+            self._bitstruct = BitStruct(*fields).compile()
+        return self._bitstruct
 
     @property
     def size(self) -> int:
-        # bitstruct.sizeof() returns bits, so that's what
-        # the code is using in your original snippet
-        return self.bitstruct.sizeof() if self.bitstruct else 0
+        # operand bytes, without building the BitStruct
+        return sum(op.format(self.name)[1] for op in self.operands) // 8
+
+    def __reduce__(self):
+        # decoded Opcodes point at their template, pickle the module tables' ones by reference
+        for table, templates in OPCODE_TABLES.items():
+            if self.id < len(templates) and templates[self.id] is self:
+                return (opcode_template, (table, self.id))
+        return (OpcodeTemplate, (self.id, self.name, self.longname, self.description, self.operands))
 
     def __repr__(self) -> str:
         return f"{self.longname} (template)"
@@ -53,48 +84,74 @@ class Operand:
     def __repr__(self) -> str:
         return f"{self.name}:={self.value}"
 
-@dataclass
 class Opcode:
-    id: int
-    name: str
-    longname: str
-    description: str
-    operands: List[Operand] = field(default_factory=list)
-    bitstruct: BitStruct = None
+    """
+    A decoded instruction, kept as a flyweight: the shared OpcodeTemplate, the
+    instruction's byte offset and its operand values. Names, descriptions and
+    Operand objects are read through the template on access.
+    """
+    __slots__ = ("template", "offset", "values")
+
+    def __init__(self, template: OpcodeTemplate, offset: Optional[int] = None, values: tuple = ()):
+        self.template = template
+        self.offset = offset
+        self.values = values
+
+    @property
+    def id(self) -> int:
+        return self.template.id
+
+    @property
+    def name(self) -> str:
+        return self.template.name
+
+    @property
+    def longname(self) -> str:
+        return self.template.longname
+
+    @property
+    def description(self) -> str:
+        return self.template.description
+
+    @property
+    def bitstruct(self) -> BitStruct:
+        return self.template.bitstruct
+
+    @property
+    def operands(self) -> List[Operand]:
+        return [Operand(o.name, o.description, o.size, v) for o, v in zip(self.template.operands, self.values)]
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Opcode):
+            return NotImplemented
+        return (self.id, self.name, self.values) == (other.id, other.name, other.values)
+
+    def __hash__(self) -> int:
+        return hash((self.id, self.values))
+
+    def __reduce__(self):
+        return (Opcode, (self.template, self.offset, self.values))
 
     def __repr__(self) -> str:
-        if self.operands:
-            operand_strs = ', '.join(str(o) for o in self.operands)
-            return f"{self.longname} ({operand_strs})"
-        return self.longname
+        longname = self.longname or self.name
+        if self.values:
+            operand_strs = ', '.join(f"{o.name}:={v}" for o, v in zip(self.template.operands, self.values))
+            return f"{longname} ({operand_strs})"
+        return longname
+
+    def dump(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "operands": {o.name: v for o, v in zip(self.template.operands, self.values)}
+        }
 
 
-def create_runtime_opcode(template: OpcodeTemplate, operand_values: dict) -> Opcode:
+def create_runtime_opcode(template: OpcodeTemplate, operand_values: dict, offset: Optional[int] = None) -> Opcode:
     """
     Build a new Opcode instance from a template plus a dict of operand values.
     """
-    # 1) Copy only what we need from the template
-    runtime_operands = []
-    for op_tmpl in template.operands:
-        val = operand_values.get(op_tmpl.name, None)
-        runtime_operands.append(
-            Operand(
-                name=op_tmpl.name,
-                description=op_tmpl.description,
-                size=op_tmpl.size,
-                value=val,
-            )
-        )
-
-    # 2) Construct a brand new Opcode
-    return Opcode(
-        id=template.id,
-        name=template.name,
-        longname=template.longname,
-        description=template.description,
-        operands=runtime_operands,
-        bitstruct=template.bitstruct,   # point to the same compiled struct
-    )
+    return Opcode(template, offset, tuple(operand_values.get(o.name, None) for o in template.operands))
 
 
 class FieldOpcodeAdapter(Adapter):
@@ -132,8 +189,141 @@ AKAOOpcodeConstruct = AKAOOpcodeAdapter(
     )
 )
 
-FieldOpcodeConstruct.compile()
-AKAOOpcodeConstruct.compile()
+class OpcodeDecoder:
+    """
+    Table-driven instruction decoder, built once from the opcode templates.
+    Each opcode gets a reader for its operands: a single struct unpack when
+    they are all bytes aligned, shifts and masks over the operand bytes
+    otherwise. Gives the same values as the templates' BitStructs.
+    """
+    def __init__(self, templates: List[OpcodeTemplate]):
+        self.templates = templates
+        self.sizes = [t.size for t in templates]
+        self.readers = [OpcodeDecoder.reader(t) for t in templates]
+
+    @staticmethod
+    def reader(template: OpcodeTemplate):
+        fields = [op.format(template.name) for op in template.operands]
+        if not fields:
+            return None
+        if all(fmt is not None for fmt, _, _ in fields):
+            return Packer("<" + "".join(fmt for fmt, _, _ in fields)).unpack_from
+        # bit fields are read MSB first over the whole operand block
+        total = sum(bits for _, bits, _ in fields)
+        layout = []
+        for fmt, bits, signed in fields:
+            total -= bits
+            layout.append((total, (1 << bits) - 1, bits // 8 if fmt is not None else 0, signed))
+        size = template.size
+        def unpack_from(buffer, offset):
+            block = int.from_bytes(buffer[offset:offset + size], 'big')
+            values = []
+            for shift, mask, nbytes, signed in layout:
+                value = (block >> shift) & mask
+                if nbytes:
+                    value = int.from_bytes(value.to_bytes(nbytes, 'big'), 'little', signed=signed)
+                values.append(value)
+            return values
+        return unpack_from
+
+    def decode(self, buffer, offset: int, terminator: int, memo: Optional[dict] = None):
+        """
+        Decodes instructions from buffer[offset:] up to and including the terminator opcode.
+        Returns the instructions and the offset following them. Instructions found in memo,
+        a dict of offset: (opcode, next offset), are reused, decoded ones are added to it.
+        """
+        templates = self.templates
+        sizes = self.sizes
+        readers = self.readers
+        length = len(buffer)
+        instructions = []
+        while True:
+            if memo is not None and offset in memo:
+                opcode, offset = memo[offset]
+                instructions.append(opcode)
+                if opcode.id == terminator:
+                    return instructions, offset
+                continue
+            if offset >= length:
+                raise StreamError("stream read less than specified amount, expected 1, found 0")
+            opcode_id = buffer[offset]
+            template = templates[opcode_id]
+            size = sizes[opcode_id]
+            offset += 1
+            if offset + size > length:
+                raise StreamError(f"stream read less than specified amount, expected {size}, found {length - offset}")
+            reader = readers[opcode_id]
+            values = tuple(reader(buffer, offset)) if reader is not None else ()
+            opcode = Opcode(template, offset - 1, values)
+            offset += size
+            instructions.append(opcode)
+            if memo is not None:
+                memo[opcode.offset] = (opcode, offset)
+            if opcode_id == terminator:
+                return instructions, offset
+
+@dataclass
+class InstructionMemo:
+    """Instruction runs decoded during one parse, keyed by absolute offset."""
+    runs: dict = field(default_factory=dict)
+    instructions: dict = field(default_factory=dict)
+    offsets: int = 0
+    referenced_instructions: int = 0
+
+    def stats(self) -> dict:
+        return {
+            "offsets": self.offsets,
+            "unique_offsets": len(self.runs),
+            "instructions": self.referenced_instructions,
+            "decoded_instructions": len(self.instructions)
+        }
+
+class InstructionsConstruct(Construct):
+    """
+    Drop-in for RepeatUntil(opcode.id == terminator, ...OpcodeConstruct), decoding the
+    whole instruction run with an OpcodeDecoder over the stream's buffer.
+    Within one parse, runs (and instructions) at the same offset are decoded once
+    and shared, see memo().
+    """
+    def __init__(self, decoder: OpcodeDecoder, terminator: int):
+        super().__init__()
+        self.decoder = decoder
+        self.terminator = terminator
+
+    def memo(self, context) -> InstructionMemo:
+        memos = context._params.setdefault("_instruction_memos", {})
+        if self not in memos:
+            memos[self] = InstructionMemo()
+        return memos[self]
+
+    def _parse(self, stream, context, path):
+        start = stream.tell()
+        if hasattr(stream, "getbuffer"):
+            memo = self.memo(context)
+            if start in memo.runs:
+                instructions, end = memo.runs[start]
+            else:
+                with stream.getbuffer() as buffer:
+                    instructions, end = self.decoder.decode(buffer, start, self.terminator, memo.instructions)
+                memo.runs[start] = (instructions, end)
+            memo.offsets += 1
+            memo.referenced_instructions += len(instructions)
+        else:
+            instructions, end = self.decoder.decode(stream.read(), 0, self.terminator)
+            end += start
+        stream.seek(end)
+        return instructions
+
+    def _build(self, obj, stream, context, path):
+        for opcode in obj:
+            template = self.decoder.templates[opcode.id]
+            stream.write(bytes([opcode.id]))
+            if template.operands:
+                stream.write(template.bitstruct.build({o.name: v for o, v in zip(template.operands, opcode.values)}))
+        return obj
+
+    def _sizeof(self, context, path):
+        raise SizeofError(path=path)
 
 
 def load_opcodes_from_json(path) -> List[OpcodeTemplate]:
@@ -163,5 +353,15 @@ def load_opcodes_from_json(path) -> List[OpcodeTemplate]:
     return templates
 
 
-fieldOpcodes = load_opcodes_from_json("FieldScriptOpcodes.json")
-akaoOpcodes  = load_opcodes_from_json("AKAOOpcodes.json")
\ No newline at end of file
+fieldOpcodes = load_opcodes_from_json(join(OPCODES_DIRECTORY, "FieldScriptOpcodes.json"))
+akaoOpcodes  = load_opcodes_from_json(join(OPCODES_DIRECTORY, "AKAOOpcodes.json"))
+
+fieldOpcodeDecoder = OpcodeDecoder(fieldOpcodes)
+akaoOpcodeDecoder = OpcodeDecoder(akaoOpcodes)
+FieldInstructionsConstruct = InstructionsConstruct(fieldOpcodeDecoder, 0x00)
+AKAOInstructionsConstruct = InstructionsConstruct(akaoOpcodeDecoder, 0xEE)
+
+OPCODE_TABLES = {"field": fieldOpcodes, "akao": akaoOpcodes}
+
+def opcode_template(table: str, id: int) -> OpcodeTemplate:
+    return OPCODE_TABLES[table][id]
@@ -0,0 +1,71 @@
+import numpy as np
+
+def _word_colors():
+    # RGBA for every 16-bit PSX color, with the same alpha rules as Palette.getAlphaMasks
+    words = np.arange(1 << 16, dtype=np.uint32)
+    red, green, blue = words & 0x1F, (words >> 5) & 0x1F, (words >> 10) & 0x1F
+    stp = (words >> 15) > 0
+    black = (red | green | blue) == 0
+    colors = np.empty((1 << 16, 4), dtype=np.uint8)
+    colors[:, 0] = (red << 3) + (red >> 2)
+    colors[:, 1] = (green << 3) + (green >> 2)
+    colors[:, 2] = (blue << 3) + (blue >> 2)
+    colors[:, 3] = np.where(black == stp, 255, 0)
+    return colors
+
+WORD_COLORS = _word_colors()
+
+# per texture page depth (4bpp, 8bpp, 15bpp): log2 of pixels per word, bits per pixel
+DEPTH_SHIFTS = np.array([2, 1, 0])
+DEPTH_BITS = np.array([4, 8, 16])
+
+class VRAM:
+    """
+    The PSX 1024x512 buffer of 16-bit words, holding a MIM's CLUT and textures at
+    their VRAM coordinates, sampled through texture pages of any depth.
+    """
+    WIDTH = 1024
+    HEIGHT = 512
+
+    def __init__(self, clut_x=0, clut_y=0):
+        self.data = np.zeros((VRAM.HEIGHT, VRAM.WIDTH), dtype=np.uint16)
+        self.clut_x = clut_x
+        self.clut_y = clut_y
+
+    @classmethod
+    def from_mim(cls, mim):
+        clut = mim.clut
+        vram = cls(clut.x, clut.y)
+        words = [(e.stp << 15) | ((e.blue >> 3) << 10) | ((e.green >> 3) << 5) | (e.red >> 3)
+                 for p in clut.palettes for e in p.entries]
+        vram.load(clut.x, clut.y, clut.width, clut.height, np.array(words, dtype=np.uint16))
+        for t in mim.textures:
+            vram.load(t.x, t.y, t.width, t.height, np.frombuffer(t.raw, dtype="<u2"))
+        return vram
+
+    def load(self, x, y, width, height, words):
+        words = np.asarray(words).reshape(height, width)
+        width = min(width, VRAM.WIDTH - x)
+        height = min(height, VRAM.HEIGHT - y)
+        self.data[y:y + height, x:x + width] = words[:height, :width]
+
+    def sample_tiles(self, clut_numbers, page_xs, page_ys, depths, us, vs, width=16, height=16):
+        """
+        RGBA texels of tiles read from texture pages, as a (tiles, height, width, 4) array.
+        4 and 8-bit pages go through the palette row clut_number, 15-bit pages are direct color.
+        """
+        clut_numbers, page_xs, page_ys, depths, us, vs = (
+            np.asarray(a, dtype=np.int64) for a in (clut_numbers, page_xs, page_ys, depths, us, vs))
+        depths = np.minimum(depths, 2)
+        shifts = DEPTH_SHIFTS[depths][:, None]
+        bits = DEPTH_BITS[depths][:, None]
+        u = us[:, None] + np.arange(width)
+        v = vs[:, None] + np.arange(height)
+        word_x = ((page_xs * 64)[:, None] + (u >> shifts)) & (VRAM.WIDTH - 1)
+        word_y = ((page_ys * 256)[:, None] + v) & (VRAM.HEIGHT - 1)
+        words = self.data[word_y[:, :, None], word_x[:, None, :]].astype(np.int64)
+        pixel_shift = (u & ((1 << shifts) - 1)) * bits
+        indices = (words >> pixel_shift[:, None, :]) & ((1 << bits) - 1)[:, :, None]
+        clut_words = self.data[(self.clut_y + clut_numbers)[:, None, None], (self.clut_x + indices) & (VRAM.WIDTH - 1)]
+        direct = (depths == 2)[:, None, None]
+        return WORD_COLORS[np.where(direct, words, clut_words)]
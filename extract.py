@@ -0,0 +1,153 @@
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from json import dump
+from traceback import format_exc
+import os
+
+FORMATS = ("json", "png", "obj", "preview")
+# previews are opt-in, they cost about as much as the tilemap render
+DEFAULT_FORMATS = ("json", "png", "obj")
+
+def find_fields(directory):
+    """Returns (name, dat path, mim path or None) for every DAT in directory."""
+    files = {f.upper(): os.path.join(directory, f) for f in os.listdir(directory)}
+    fields = []
+    for upper, path in sorted(files.items()):
+        if upper.endswith(".DAT"):
+            name = upper[:-4]
+            fields.append((name, path, files.get(name + ".MIM")))
+    return fields
+
+def outputs_for(name, has_mim, output_dir, formats):
+    folder = os.path.join(output_dir, name)
+    outputs = {}
+    if "json" in formats:
+        outputs["json"] = os.path.join(folder, "script.json")
+    if "png" in formats and has_mim:
+        outputs["tilemap"] = os.path.join(folder, "tilemap.png")
+        outputs["mim"] = os.path.join(folder, "mim.png")
+    if "obj" in formats:
+        outputs["obj"] = os.path.join(folder, "walkmesh.obj")
+    if "preview" in formats:
+        outputs["preview"] = os.path.join(folder, "preview.png")
+    return outputs
+
+def is_up_to_date(sources, outputs):
+    newest = max(os.path.getmtime(s) for s in sources)
+    return all(os.path.exists(o) and os.path.getmtime(o) >= newest for o in outputs)
+
+def extract_field(name, dat_path, mim_path, output_dir, formats, cache_dir=None, profile=None, cprofile=False):
+    """
+    Parse one field (and its MIM) and write the requested artifacts.
+    Runs in a worker process, returns (name, status, message, profiler report or None).
+    With cprofile, the field's cProfile stats go to profile.NAME.prof.
+    """
+    from constructs.field import Field
+    from constructs.field.preview import render_preview
+    from constructs.mim import MIM
+    from utils.cache import FieldCache
+    from utils.profiling import profiler
+    if profile is not None:
+        profiler.enable(cprofile)
+        profiler.reset()
+    try:
+        outputs = outputs_for(name, mim_path is not None, output_dir, formats)
+        os.makedirs(os.path.join(output_dir, name), exist_ok=True)
+        cache = None if cache_dir is None else FieldCache(cache_dir)
+        field = Field.from_file(dat_path, lazy=True) if cache is None else cache.load_field(dat_path)
+        if "json" in outputs:
+            with open(outputs["json"], "w", encoding="utf-8") as f:
+                dump(field.dump(), f, indent=2, ensure_ascii=False)
+        if "obj" in outputs:
+            with open(outputs["obj"], "w", encoding="utf-8") as f:
+                f.write(field.walkmesh.to_obj())
+        mim = None
+        if mim_path is not None and ("tilemap" in outputs or "preview" in outputs):
+            mim = MIM.from_file(mim_path) if cache is None else cache.load_mim(mim_path)
+        if "tilemap" in outputs:
+            field.tilemap.get_image_data(mim).save(outputs["tilemap"])
+            mim.get_image_data(0).save(outputs["mim"])
+        if "preview" in outputs:
+            # the walkmesh over the background, over a plain one without a MIM
+            render_preview(field, mim).save(outputs["preview"])
+        return name, "ok", ", ".join(os.path.basename(o) for o in outputs.values()), field_report(name, profile, cprofile)
+    except Exception:
+        return name, "error", format_exc(), field_report(name, profile, cprofile)
+
+def field_report(name, profile, cprofile):
+    from utils.profiling import profiler
+    if profile is None:
+        return None
+    if cprofile:
+        profiler.cprofile.create_stats()
+        profiler.cprofile.dump_stats(f"{profile}.{name}.prof")
+    return profiler.report()
+
+def write_profile(path, reports):
+    """Writes the per field reports and their stages summed over the batch."""
+    stages = {}
+    for report in reports.values():
+        for stage_name, stage in report["stages"].items():
+            total = stages.setdefault(stage_name, {})
+            for key, value in stage.items():
+                total[key] = total.get(key, 0) + value
+    with open(path, "w", encoding="utf-8") as f:
+        dump({"stages": stages, "fields": reports}, f, indent=2)
+
+def main():
+    parser = ArgumentParser(description="Extract every field of a PSX FIELD directory")
+    parser.add_argument("directory", help="directory holding the *.DAT / *.MIM files")
+    parser.add_argument("-o", "--output", default="output", help="output directory")
+    parser.add_argument("-f", "--formats", default=",".join(DEFAULT_FORMATS),
+                        help=f"comma separated artifacts to write, among {', '.join(FORMATS)}")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="rewrite outputs that are up to date")
+    parser.add_argument("--cache", default=None, help="directory caching decompressed and parsed fields")
+    parser.add_argument("--profile", default=None, help="write per stage timings of every field to this JSON file")
+    parser.add_argument("--cprofile", action="store_true", help="with --profile, also write PROFILE.NAME.prof cProfile stats")
+    args = parser.parse_args()
+    formats = set(f.strip() for f in args.formats.split(",") if f.strip())
+    unknown = formats.difference(FORMATS)
+    if unknown:
+        parser.error(f"unknown formats: {', '.join(sorted(unknown))}")
+
+    fields = find_fields(args.directory)
+    pending = []
+    skipped = 0
+    for name, dat_path, mim_path in fields:
+        sources = [dat_path] if mim_path is None else [dat_path, mim_path]
+        outputs = outputs_for(name, mim_path is not None, args.output, formats)
+        if not args.force and is_up_to_date(sources, outputs.values()):
+            skipped += 1
+        else:
+            pending.append((name, dat_path, mim_path))
+    print(f"{len(fields)} fields, {skipped} up to date, {len(pending)} to extract")
+
+    errors = 0
+    reports = {}
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = {executor.submit(extract_field, name, dat_path, mim_path, args.output, formats, args.cache,
+                                   args.profile, args.cprofile): name
+                   for name, dat_path, mim_path in pending}
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                name, status, message, report = future.result()
+            except BrokenProcessPool:
+                # a worker died (e.g. killed when out of memory), the fields left pending fail with it
+                name, status, message, report = futures[future], "error", "worker process died abruptly", None
+            if report is not None:
+                reports[name] = report
+            if status == "error":
+                errors += 1
+                print(f"[{done}/{len(pending)}] {name}: error\n{message}")
+            else:
+                print(f"[{done}/{len(pending)}] {name}: {message}")
+    print(f"done, {len(pending) - errors} extracted, {skipped} skipped, {errors} failed")
+    if args.profile is not None:
+        write_profile(args.profile, reports)
+    if errors:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
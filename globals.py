@@ -1,7 +1,4 @@
 from dataclasses import dataclass
-from utils.lzs import LZS
-
-lzs = LZS()
 
 @dataclass
 class Vertex3:
@@ -0,0 +1,77 @@
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from time import perf_counter
+from traceback import format_exc
+import os
+
+# the LZS compressed files of a FIELD directory
+EXTENSIONS = (".DAT", ".MIM")
+
+def find_files(directory):
+    """Returns (name, path) for every LZS compressed file in directory."""
+    return sorted(
+        (f.upper(), os.path.join(directory, f)) for f in os.listdir(directory)
+        if os.path.splitext(f)[1].upper() in EXTENSIONS
+    )
+
+def recompress_file(name, path, output_dir, level, verify=False):
+    """
+    Decompress one file and compress it again at level into output_dir.
+    Runs in a worker process, returns (name, status, message, decompressed size, seconds).
+    """
+    from utils.lzs import LZS
+    try:
+        with open(path, 'rb') as f:
+            source = f.read()
+        data = bytes(LZS.decompress(source))
+        start = perf_counter()
+        packed = LZS.compress(data, level)
+        seconds = perf_counter() - start
+        if verify and bytes(LZS.decompress(packed)) != data:
+            return name, "error", "round-trip mismatch", len(data), seconds
+        with open(os.path.join(output_dir, os.path.basename(path)), 'wb') as f:
+            f.write(packed)
+        return name, "ok", f"{len(source)} -> {len(packed)} bytes", len(data), seconds
+    except Exception:
+        return name, "error", format_exc(), 0, 0.0
+
+def main():
+    from utils.lzs import COMPRESSION_LEVELS
+    parser = ArgumentParser(description="Recompress every DAT / MIM of a PSX FIELD directory")
+    parser.add_argument("directory", help="directory holding the *.DAT / *.MIM files")
+    parser.add_argument("-o", "--output", default="recompressed", help="output directory")
+    parser.add_argument("-l", "--level", default="fast", choices=sorted(COMPRESSION_LEVELS))
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--verify", action="store_true", help="check every file decompresses back to the same bytes")
+    args = parser.parse_args()
+    if os.path.abspath(args.output) == os.path.abspath(args.directory):
+        parser.error("the output directory must not be the source directory")
+    os.makedirs(args.output, exist_ok=True)
+
+    files = find_files(args.directory)
+    print(f"{len(files)} files to recompress at level {args.level}")
+    errors = 0
+    total_bytes = 0
+    total_seconds = 0.0
+    start = perf_counter()
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = [executor.submit(recompress_file, name, path, args.output, args.level, args.verify)
+                   for name, path in files]
+        for done, future in enumerate(as_completed(futures), 1):
+            name, status, message, size, seconds = future.result()
+            total_bytes += size
+            total_seconds += seconds
+            if status == "error":
+                errors += 1
+                print(f"[{done}/{len(files)}] {name}: error\n{message}")
+            else:
+                print(f"[{done}/{len(files)}] {name}: {message}")
+    elapsed = perf_counter() - start
+    mb = total_bytes / (1024 * 1024)
+    print(f"done, {len(files) - errors} recompressed, {errors} failed, {mb:.1f} MB in {elapsed:.1f} s "
+          f"({mb / max(elapsed, 1e-9):.2f} MB/s, {mb / max(total_seconds, 1e-9):.2f} MB/s per worker)")
+    if errors:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
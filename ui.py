@@ -6,27 +6,64 @@ from pyopengltk import OpenGLFrame
 from OpenGL.GL import *
 from OpenGL.GLU import *
 from tkinter import ttk, filedialog
+from utils.profiling import profiler
 from PIL import ImageTk, Image
 import math
+import numpy as np
 import tkinter as tk
 
 class WalkmeshFrame(OpenGLFrame):
+    """
+    Wireframe walkmesh seen from the field camera. The mesh goes into vertex and index
+    buffers once per walkmesh and the view is only set up when the camera or the size
+    change, so a redraw is a single draw call. Nothing animates: the frame redraws on
+    expose and when request_redraw is called.
+    """
     def __init__(self, *args, **kw):
         super().__init__(*args, **kw)
         self.walkmesh: Walkmesh = None
         self.camera: Camera = None
+        self.vertex_buffer = None
+        self.index_buffer = None
+        self.index_count = 0
+        self.uploaded: Walkmesh = None
+        self.redraw_pending = None
 
     def set_walkmesh_camera(self, walkmesh, camera):
         self.walkmesh = walkmesh
         self.camera = camera
+        if self.context_created:
+            self.tkMakeCurrent()
+            self.upload()
+            self.setup_view()
+        self.request_redraw()
 
-    def initgl(self):
-        glClearColor(0.2, 0.2, 0.2, 1.0)
-        glEnable(GL_DEPTH_TEST)
+    def request_redraw(self):
+        """Redraws once Tk is idle, requests made before then share that redraw."""
+        if self.context_created and self.redraw_pending is None:
+            self.redraw_pending = self.after_idle(self.redraw_now)
 
-    def redraw(self):
-        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+    def redraw_now(self):
+        self.redraw_pending = None
+        self._display()
+
+    def upload(self):
+        """Loads the walkmesh vertices, shared between triangles, and the triangle indices into buffers."""
+        with profiler.stage("walkmesh.upload", objects=self.walkmesh.nb_sectors):
+            if self.vertex_buffer is None:
+                self.vertex_buffer, self.index_buffer = glGenBuffers(2)
+            vertices, indices = np.unique(self.walkmesh.vertices.reshape(-1, 3), axis=0, return_inverse=True)
+            vertices = (vertices / 4096).astype(np.float32)
+            indices = indices.astype(np.uint32).ravel()
+            glBindBuffer(GL_ARRAY_BUFFER, self.vertex_buffer)
+            glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL_STATIC_DRAW)
+            glVertexPointer(3, GL_FLOAT, 0, None)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.index_buffer)
+            glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, GL_STATIC_DRAW)
+            self.index_count = len(indices)
+            self.uploaded = self.walkmesh
 
+    def setup_view(self):
         glMatrixMode(GL_PROJECTION)
         glLoadIdentity()
         gluPerspective(
@@ -38,21 +75,29 @@ class WalkmeshFrame(OpenGLFrame):
 
         glMatrixMode(GL_MODELVIEW)
         glLoadIdentity()
-        if self.walkmesh:
+        if self.camera:
             gluLookAt(
                 self.camera.tx, self.camera.ty, self.camera.tz,
                 self.camera.tx + self.camera.axis_z.x, self.camera.ty + self.camera.axis_z.y, self.camera.tz + self.camera.axis_z.z,
                 self.camera.axis_y.x, self.camera.axis_y.y, self.camera.axis_y.z
             )
-            glPolygonMode(GL_FRONT_AND_BACK, GL_LINE)
-            glColor3f(1.0, 1.0, 1.0)  # White lines
-            glBegin(GL_TRIANGLES)
-            for t in self.walkmesh.triangles:
-                for v in t.vertices:
-                    glVertex3f(v.x / 4096, v.y / 4096, v.z / 4096)
-            glEnd()
-            # Restore to fill mode if you plan to draw something else
-            glPolygonMode(GL_FRONT_AND_BACK, GL_FILL)
+
+    def initgl(self):
+        # called when the frame is mapped and on every resize, the buffers outlive both
+        glClearColor(0.2, 0.2, 0.2, 1.0)
+        glEnable(GL_DEPTH_TEST)
+        glPolygonMode(GL_FRONT_AND_BACK, GL_LINE)
+        glColor3f(1.0, 1.0, 1.0)  # White lines
+        glEnableClientState(GL_VERTEX_ARRAY)
+        if self.walkmesh is not None and self.uploaded is not self.walkmesh:
+            self.upload()
+        self.setup_view()
+        self.request_redraw()
+
+    def redraw(self):
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        if self.index_count:
+            glDrawElements(GL_TRIANGLES, self.index_count, GL_UNSIGNED_INT, None)
 
 class FieldForm(tk.Tk):
     def __init__(self, screenName = None, baseName = None, className = "Tk", useTk = True, sync = False, use = None):
@@ -234,7 +279,7 @@ class FieldForm(tk.Tk):
         filepath = filedialog.askopenfilename(title="FF7 Field DAT", filetypes=[("DAT Files", "*.DAT")])
         if not filepath:
             return
-        self.field = Field.from_file(filepath)
+        self.field = Field.from_file(filepath, lazy=True)
         mimfilepath = filepath.replace(".DAT",".MIM")
         self.mim = MIM.from_file(mimfilepath)
         self.refresh()
@@ -259,7 +304,6 @@ class FieldForm(tk.Tk):
             self.akaos_list.insert(tk.END, str(akao.id))
         self.resize_mim(self.winfo_width(), self.winfo_height()-32)
         self.ogl_frame.set_walkmesh_camera(self.field.walkmesh, self.field.camera)
-        self.ogl_frame.animate = 1
         self.resize_tilemap(self.winfo_width(), self.winfo_height()-32)
 
     def on_dialog_selected(self, event):
@@ -332,8 +376,9 @@ class FieldForm(tk.Tk):
         scale_factor = min(width_ratio, height_ratio)
         new_width = int(ow * scale_factor)
         new_height = int(oh * scale_factor)
-        new_image = original_image.resize((new_width, new_height),resample=Image.Resampling.LANCZOS)
-        self.mim_image = ImageTk.PhotoImage(new_image)
+        with profiler.stage("tk.photoimage", bytes=new_width * new_height * 4):
+            new_image = original_image.resize((new_width, new_height),resample=Image.Resampling.LANCZOS)
+            self.mim_image = ImageTk.PhotoImage(new_image)
         self.mim_frame.config(image=self.mim_image)
 
     def resize_tilemap(self, max_width, max_height):
@@ -344,8 +389,9 @@ class FieldForm(tk.Tk):
         scale_factor = min(width_ratio, height_ratio)
         new_width = int(ow * scale_factor)
         new_height = int(oh * scale_factor)
-        new_image = original_image.resize((new_width, new_height),resample=Image.Resampling.LANCZOS)
-        self.tilemap_image = ImageTk.PhotoImage(new_image)
+        with profiler.stage("tk.photoimage", bytes=new_width * new_height * 4):
+            new_image = original_image.resize((new_width, new_height),resample=Image.Resampling.LANCZOS)
+            self.tilemap_image = ImageTk.PhotoImage(new_image)
         self.tilemap_frame.config(image=self.tilemap_image)
 
 if __name__ == '__main__':
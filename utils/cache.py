@@ -0,0 +1,131 @@
+from constructs.compiled import compiled
+from constructs.field import Field
+from constructs.mim import MIM, MIMConstruct
+from hashlib import sha1
+from io import BytesIO
+from utils.lzs import LZS
+import os
+import pickle
+
+# Bump whenever a construct or one of the parsed classes changes, so that
+# entries written by an older parser are never loaded.
+PARSER_VERSION = 11
+
+class FieldCache:
+    """
+    Persistent cache of decompressed DAT/MIM files and of their parsed
+    Field/MIM objects, keyed by a hash of the source bytes and the parser
+    version. Once the directory grows past max_size, the least recently
+    used entries are evicted.
+    """
+    def __init__(self, directory=None, max_size=512 * 1024 * 1024):
+        if directory is None:
+            directory = os.path.join(os.path.expanduser("~"), ".cache", "ff7py")
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(data) -> str:
+        digest = sha1(PARSER_VERSION.to_bytes(4, 'little'))
+        digest.update(data)
+        return digest.hexdigest()
+
+    def _path(self, key, kind):
+        return os.path.join(self.directory, f"{key}.{kind}")
+
+    def _read(self, path):
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # the modification time is the LRU clock
+            os.utime(path)
+        except FileNotFoundError:
+            # evicted by another worker, before or after the read, counts as a miss
+            return None
+        return data
+
+    def _write(self, path, data):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self.evict()
+
+    def _blob(self, key, source):
+        blob_path = self._path(key, "bin")
+        blob = self._read(blob_path)
+        if blob is None:
+            blob = bytes(LZS.decompress(source))
+            self._write(blob_path, blob)
+        return blob
+
+    def decompress(self, path: str) -> bytes:
+        """Decompressed bytes of an LZS file, from the cache when possible."""
+        with open(path, 'rb') as f:
+            source = f.read()
+        return self._blob(self.key(source), source)
+
+    def _load(self, path, parse):
+        with open(path, 'rb') as f:
+            source = f.read()
+        key = self.key(source)
+        cached = self._read(self._path(key, "pickle"))
+        if cached is not None:
+            try:
+                obj = pickle.loads(cached)
+                self.hits += 1
+                return obj
+            except Exception:
+                pass
+        self.misses += 1
+        obj = parse(self._blob(key, source))
+        self._write(self._path(key, "pickle"), pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+        return obj
+
+    def load_field(self, path: str) -> Field:
+        def parse(blob):
+            field = Field(data=blob)
+            return field.script, field.walkmesh, field.tilemap, field.camera
+        script, walkmesh, tilemap, camera = self._load(path, parse)
+        return Field(script=script, walkmesh=walkmesh, tilemap=tilemap, camera=camera)
+
+    def load_mim(self, path: str) -> MIM:
+        def parse(blob):
+            mim = compiled(MIMConstruct).parse_stream(BytesIO(blob))
+            return MIM(mim.clut, mim.textures)
+        return self._load(path, parse)
+
+    def _entries(self, tmp=True):
+        # (mtime, size, path) of the files, skipping the ones another worker evicts meanwhile
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and (tmp or not entry.name.endswith(".tmp")):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        entries = self._entries(tmp=False)
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.is_file():
+                os.remove(entry.path)
@@ -1,79 +1,483 @@
-from io import BytesIO
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from io import BytesIO, RawIOBase, SEEK_CUR, SEEK_END, SEEK_SET
+from struct import Struct, error as StructError
+from sys import maxsize
+from typing import Iterator, List, Optional
+from zlib import compress as zlib_compress, crc32, decompress as zlib_decompress, error as ZlibError
+import numpy as np
+import os
+
+RING_SIZE = 4096
+RING_MASK = RING_SIZE - 1
+OFFSET_BIAS = 18
+MIN_MATCH = 3
+MAX_MATCH = 18
+# worst case expansion: one control byte followed by 8 references of 18 bytes
+MAX_BLOCK_OUTPUT = 8 * MAX_MATCH
+
+def _control_runs(flags):
+    # Split a control byte into runs: n > 0 is n literals, n < 0 is -n references
+    runs = []
+    for i in range(8):
+        literal = (flags >> i) & 1
+        if runs and (runs[-1] > 0) == bool(literal):
+            runs[-1] += 1 if literal else -1
+        else:
+            runs.append(1 if literal else -1)
+    return tuple(runs)
+
+CONTROL_RUNS = tuple(_control_runs(flags) for flags in range(256))
+
+def _payload_end(data):
+    return min(4 + int.from_bytes(data[:4], 'little'), len(data))
+
+def _inflate(src, pos, end, out, o, stop=maxsize):
+    """
+    Decode control blocks from src[pos:end] into out starting at index o, until
+    the input is exhausted or out holds at least `stop` bytes.
+    out must hold a RING_SIZE zero prefix (or the previous window) before o.
+    Returns the new (pos, o).
+    """
+    runs_table = CONTROL_RUNS
+    while pos < end and o < stop:
+        if o + MAX_BLOCK_OUTPUT > len(out):
+            out.extend(bytes(len(out)))
+        runs = runs_table[src[pos]]
+        pos += 1
+        for run in runs:
+            if run > 0:
+                nxt = pos + run
+                if nxt > end:
+                    nxt = end
+                    run = end - pos
+                out[o:o + run] = src[pos:nxt]
+                o += run
+                pos = nxt
+                if pos == end:
+                    return pos, o
+            else:
+                for _ in range(-run):
+                    if pos + 2 > end:
+                        return end, o
+                    hi = src[pos + 1]
+                    length = (hi & 0x0F) + MIN_MATCH
+                    s = o - (((o - src[pos] - ((hi & 0xF0) << 4) - OFFSET_BIAS - 1) & RING_MASK) + 1)
+                    pos += 2
+                    e = s + length
+                    if e <= o:
+                        out[o:o + length] = out[s:e]
+                    else:
+                        # overlapping copy, the bytes between s and o repeat
+                        out[o:o + length] = (out[s:o] * MAX_MATCH)[:length]
+                    o += length
+    return pos, o
+
+# name: (longest hash chain walked per position, match length past which only a quarter
+# of the chain is walked, match length that stops the walk, optimal parsing)
+COMPRESSION_LEVELS = {
+    "fast": (8, 6, 10, False),
+    "max": (64, 8, MAX_MATCH, True),
+}
+
+def _find_matches(buf, start, max_chain, good_len, nice_len):
+    """
+    Longest match of every position of buf[start:] among the positions up to RING_SIZE
+    back that start with the same 3 bytes, walking the chains of all positions at once.
+    Positions inside a match of nice_len or more aren't searched, the match shifted
+    stands in. Returns (lengths, sources) arrays, lengths below MIN_MATCH for none.
+    """
+    data = np.frombuffer(buf, dtype=np.uint8)
+    n = len(data)
+    count = n - start
+    lengths = np.zeros(count, dtype=np.int64)
+    sources = np.zeros(count, dtype=np.int64)
+    if count < MIN_MATCH:
+        return lengths, sources
+    # the previous position with the same 3 bytes, from a stable sort of the keys
+    keys = (data[:-2].astype(np.int32) << 16) | (data[1:-1].astype(np.int32) << 8) | data[2:]
+    order = np.argsort(keys, kind="stable")
+    same = keys[order[1:]] == keys[order[:-1]]
+    prev = np.full(n - 2, -1, dtype=np.int64)
+    prev[order[1:][same]] = order[:-1][same]
+    # the 4 bytes from every position as one little-endian word, zero padded past the end
+    padded = np.concatenate((data, np.zeros(3, dtype=np.uint8))).astype(np.uint32)
+    words = padded[:-3] | (padded[1:-2] << 8) | (padded[2:-1] << 16) | (padded[3:] << 24)
+    positions = np.arange(start, n - 2)
+    limits = np.minimum(MAX_MATCH, n - positions)
+    stops = np.minimum(nice_len, limits)
+    candidates = prev[start:]
+    active = np.flatnonzero((candidates >= 0) & (positions - candidates <= RING_SIZE))
+    for depth in range(max_chain):
+        if len(active) == 0:
+            break
+        source = candidates[active]
+        target = positions[active]
+        limit = limits[active]
+        length = np.full(len(active), MIN_MATCH)
+        # extend the 3 byte matches 4 bytes at a time, the lowest differing byte ends a match
+        growing = np.flatnonzero(limit > MIN_MATCH)
+        while len(growing):
+            k = length[growing]
+            diff = words[source[growing] + k] ^ words[target[growing] + k]
+            equal = (diff & 0xFF == 0).astype(np.int64) + (diff & 0xFFFF == 0) + (diff & 0xFFFFFF == 0) + (diff == 0)
+            length[growing] += equal
+            growing = growing[(diff == 0) & (length[growing] < limit[growing])]
+        length = np.minimum(length, limit)
+        better = length > lengths[active]
+        lengths[active[better]] = length[better]
+        sources[active[better]] = source[better]
+        if depth == 0:
+            active = _skip_covered(lengths, sources, active, nice_len)
+            source = candidates[active]
+            target = positions[active]
+        best = lengths[active]
+        candidates[active] = prev[source]
+        source = candidates[active]
+        keep = (source >= 0) & (target - source <= RING_SIZE) & (best < stops[active])
+        if depth + 1 >= max_chain >> 2:
+            # a good enough match walks a quarter of the chain
+            keep &= best < good_len
+        active = active[keep]
+    return lengths, sources
+
+def _skip_covered(lengths, sources, active, nice_len):
+    # the positions after the start of a nice_len match get the rest of it and leave the search
+    count = len(lengths)
+    index = np.arange(count)
+    ends = np.where(lengths >= nice_len, index + lengths, 0)
+    # furthest end of the long matches starting before each position, and where that match starts
+    furthest = np.maximum.accumulate(ends * count + index)
+    furthest = np.concatenate(([0], furthest[:-1]))
+    first, end = furthest % count, furthest // count
+    covered = end - index >= MIN_MATCH
+    shifted = covered & (end - index > lengths)
+    lengths[shifted] = (end - index)[shifted]
+    sources[shifted] = (sources[first] + index - first)[shifted]
+    return active[~covered[active]]
+
+def _parse_greedy(lengths):
+    """Token (starts, lengths) taking the longest match at every position, literals in between."""
+    steps = np.where(lengths >= MIN_MATCH, lengths, 1).tolist()
+    taken = []
+    i = 0
+    # only the match positions are visited, a literal run is skipped at once
+    for k in np.flatnonzero(lengths >= MIN_MATCH).tolist():
+        if k >= i:
+            taken.append(k)
+            i = k + steps[k]
+    return _tokens(len(lengths), taken, steps)
+
+def _parse_optimal(lengths):
+    """Token (starts, lengths) of the cheapest parse, literals costing 9 bits and references 17."""
+    count = len(lengths)
+    lengths = lengths.tolist()
+    cost = [0] * (count + 1)
+    steps = [1] * (count + 1)
+    for k in range(count - 1, -1, -1):
+        best = cost[k + 1] + 9
+        length = lengths[k]
+        if length >= MIN_MATCH:
+            window = cost[k + MIN_MATCH:k + length + 1]
+            cheapest = min(window)
+            if cheapest + 17 <= best:
+                best = cheapest + 17
+                # the longest of the equally cheap lengths
+                steps[k] = length - window[::-1].index(cheapest)
+        cost[k] = best
+    taken = []
+    k = 0
+    while k < count:
+        if steps[k] > 1:
+            taken.append(k)
+        k += steps[k]
+    return _tokens(count, taken, steps)
+
+def _tokens(count, taken, steps):
+    # (starts, lengths) of all tokens, from the start of the matches taken and the literals left
+    taken = np.array(taken, dtype=np.int64)
+    lengths = np.array(steps[:count], dtype=np.int64)[taken] if len(taken) else taken
+    covered = np.zeros(count + 1, dtype=np.int64)
+    np.add.at(covered, taken, 1)
+    np.add.at(covered, taken + lengths, -1)
+    literal = np.cumsum(covered[:count]) == 0
+    starts = np.sort(np.concatenate((np.flatnonzero(literal), taken)))
+    token_lengths = np.ones(len(starts), dtype=np.int64)
+    token_lengths[np.searchsorted(starts, taken)] = lengths
+    return starts, token_lengths
+
+def _encode(data, starts, lengths, sources):
+    """The LZS payload of the tokens, flag bytes grouping them by 8."""
+    count = len(starts)
+    literal = lengths == 1
+    sizes = np.where(literal, 1, 2)
+    groups = np.arange(count) // 8
+    # every token follows its group's flag byte and the tokens before it
+    offsets = 4 + groups + 1 + np.cumsum(sizes) - sizes
+    out = np.zeros(4 + (count + 7) // 8 + int(sizes.sum()), dtype=np.uint8)
+    if count:
+        out[offsets[::8] - 1] = np.add.reduceat(literal.astype(np.int64) << (np.arange(count) % 8), np.arange(0, count, 8))
+    out[offsets[literal]] = data[starts[literal]]
+    references = ~literal
+    offset = (sources[starts[references]] - RING_SIZE - OFFSET_BIAS) & RING_MASK
+    out[offsets[references]] = offset & 0xFF
+    out[offsets[references] + 1] = ((offset >> 4) & 0xF0) | (lengths[references] - MIN_MATCH)
+    out[:4] = np.frombuffer((len(out) - 4).to_bytes(4, 'little'), dtype=np.uint8)
+    return out.tobytes()
 
 class LZS:
-    def __init__(self):
-        self.size = 4096
-        self.start = 0
-        self.count = 0
-        self.elems = bytearray(self.size)
-
-    def _is_empty(self):
-        return self.count == 0
-
-    def _is_full(self):
-        return self.count == self.size
-
-    def _read_cb(self, offset, size, elem):
-        realoffset = (offset + 18) & 0xFFF
-        end = (self.start + self.count) & 0xFFF
-        i = 0
-        writeoffset = 0
-        if (realoffset + size) > end and realoffset < end:
-            value = 0
-            max_read = end - realoffset
-            while writeoffset < size:
-                value = self.elems[realoffset + i]
-                elem[writeoffset] = value
-                writeoffset += 1
-                i += 1
-                if i == max_read:
-                    i = 0
+    @staticmethod
+    def decompress(data, limit=None) -> bytearray:
+        """
+        Decompress a whole LZS payload (4-byte size header included) held in any
+        bytes-like object: bytes, bytearray, memoryview or mmap.
+        With a limit, decoding stops once that many bytes are available.
+        """
+        end = _payload_end(data)
+        # the output starts with a zeroed window so references before the
+        # start of the data read zeros, like the initial ring buffer
+        if limit is None:
+            out = bytearray(RING_SIZE + (end - 4) * 9)
+            _, o = _inflate(data, 4, end, out, RING_SIZE)
         else:
-            for i in range(size):
-                elem[writeoffset] = self.elems[(realoffset + i) & 0xFFF]
-                writeoffset += 1
-
-    def _write_cb(self, elem):
-        end = (self.start + self.count) & 0xFFF
-        self.elems[end] = elem
-        if self._is_full():
-            self.start = (self.start + 1) & 0xFFF
+            out = bytearray(RING_SIZE + limit + MAX_BLOCK_OUTPUT)
+            _, o = _inflate(data, 4, end, out, RING_SIZE, RING_SIZE + limit)
+            o = min(o, RING_SIZE + limit)
+        del out[o:]
+        del out[:RING_SIZE]
+        return out
+
+    @staticmethod
+    def iter_decompress(data, chunk_size=0x10000, limit=None) -> Iterator[bytes]:
+        """
+        Decompress an LZS payload incrementally, yielding chunks of about
+        chunk_size bytes. Only the last 4 KB window is kept between chunks.
+        With a limit, decoding stops once that many bytes were yielded.
+        """
+        end = _payload_end(data)
+        out = bytearray(2 * RING_SIZE + chunk_size + MAX_BLOCK_OUTPUT)
+        pos = 4
+        start = RING_SIZE
+        remaining = limit
+        while pos < end and remaining != 0:
+            stop = chunk_size if remaining is None else min(chunk_size, remaining)
+            pos, o = _inflate(data, pos, end, out, start, start + stop)
+            if remaining is not None:
+                o = min(o, start + remaining)
+                remaining -= o - start
+            if o > start:
+                yield bytes(out[start:o])
+            # slide the window, keeping the output index aligned on the ring
+            start = RING_SIZE + (o & RING_MASK)
+            out[:start] = out[o - start:o]
+
+    @staticmethod
+    def decompress_range(data, offset, size=None, index=None) -> bytearray:
+        """
+        Decompress size bytes (up to the end when None) starting at output
+        offset. With an LZSIndex, decoding resumes from the last checkpoint
+        before offset instead of the start of the payload.
+        """
+        end = _payload_end(data)
+        checkpoint = index.find(offset) if index is not None else None
+        if checkpoint is None:
+            out = bytearray(RING_SIZE)
+            pos = 4
+            base = 0
         else:
-            self.count += 1
+            # pad in front so the output index stays aligned on the ring
+            out = bytearray(checkpoint.output_pos & RING_MASK) + checkpoint.window
+            pos = checkpoint.input_pos
+            base = checkpoint.output_pos
+        start = len(out)
+        stop = maxsize if size is None else start + offset + size - base
+        _, o = _inflate(data, pos, end, out, start, stop)
+        return out[start + offset - base:min(o, stop)]
 
-    def un_lzs(self, input_path):
-        # Initialize
-        self.start = 0
-        self.count = 0
-        self.elems[:] = bytearray(self.size)
-        bytebuff = bytearray(18)
-        offsetsize = bytearray(2)
+    @staticmethod
+    def compress(data, level="fast") -> bytes:
+        """
+        Compress data into an LZS payload (4-byte size header included) that
+        decompress and un_lzs read back. level is "fast" (greedy parsing over
+        short hash chains) or "max" (optimal parsing over long hash chains).
+        """
+        if level not in COMPRESSION_LEVELS:
+            raise ValueError(f"Unknown LZS compression level {level!r}")
+        max_chain, good_len, nice_len, optimal = COMPRESSION_LEVELS[level]
+        # the zeroed window in front lets runs of zeros at the start be references
+        buf = bytes(RING_SIZE) + bytes(data)
+        lengths, sources = _find_matches(buf, RING_SIZE, max_chain, good_len, nice_len)
+        starts, lengths = _parse_optimal(lengths) if optimal else _parse_greedy(lengths)
+        return _encode(np.frombuffer(buf, dtype=np.uint8)[RING_SIZE:], starts, lengths, sources)
 
+    @staticmethod
+    def un_lzs(input_path) -> BytesIO:
         with open(input_path, 'rb') as f:
-            reader = f.read
-            filesize = int.from_bytes(reader(4), 'little')
-            stream = BytesIO()
-            while f.tell() != filesize:
-                b_control = reader(1)
-                if not b_control:
-                    break
-                for i in range(8):
-                    mask = 1 << i
-                    if (mask & ord(b_control)) > 0:
-                        literal = reader(1)
-                        if not literal:
-                            break
-                        self._write_cb(ord(literal))
-                        stream.write(literal)
-                    else:
-                        offsetsize = reader(2)
-                        if not offsetsize:
-                            break
-                        length = (offsetsize[1] & 0x0F) + 3
-                        offset = offsetsize[0] + ((offsetsize[1] & 0xF0) << 4)
-                        self._read_cb(offset, length, bytebuff)
-                        for j in range(length):
-                            self._write_cb(bytebuff[j])
-                        stream.write(bytebuff[:length])
-            stream.seek(0)
-            return stream
+            data = f.read()
+        return BytesIO(LZS.decompress(data))
+
+class LZSReader(RawIOBase):
+    """
+    Read-only file object over an LZS payload that only decodes as far as
+    the reads and seeks go, so parsing a header leaves the rest compressed.
+    """
+    def __init__(self, data):
+        super().__init__()
+        self._data = data
+        self._pos = 4
+        self._end = _payload_end(data)
+        self._out = bytearray(RING_SIZE + MAX_BLOCK_OUTPUT)
+        self._o = RING_SIZE
+        self._offset = 0
+
+    @classmethod
+    def open(cls, path: str):
+        with open(path, 'rb') as f:
+            return cls(f.read())
+
+    @property
+    def decoded(self) -> int:
+        """Number of bytes decoded so far."""
+        return self._o - RING_SIZE
+
+    def _fill(self, size=None):
+        if self._pos < self._end and (size is None or self._o < RING_SIZE + size):
+            stop = maxsize if size is None else RING_SIZE + size
+            self._pos, self._o = _inflate(self._data, self._pos, self._end, self._out, self._o, stop)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._offset
+
+    def seek(self, offset, whence=SEEK_SET):
+        if whence == SEEK_CUR:
+            offset += self._offset
+        elif whence == SEEK_END:
+            self._fill()
+            offset += self.decoded
+        elif whence != SEEK_SET:
+            raise ValueError(f"Invalid whence {whence}")
+        if offset < 0:
+            raise ValueError(f"Negative seek position {offset}")
+        self._offset = offset
+        return offset
+
+    def readinto(self, b):
+        size = len(b)
+        self._fill(self._offset + size)
+        start = RING_SIZE + self._offset
+        chunk = self._out[start:min(start + size, self._o)]
+        b[:len(chunk)] = chunk
+        self._offset += len(chunk)
+        return len(chunk)
+
+    def readall(self):
+        self._fill()
+        return self.read(max(self.decoded - self._offset, 0))
+
+@dataclass
+class LZSCheckpoint:
+    input_pos: int
+    output_pos: int
+    window: bytes
+
+@dataclass
+class LZSIndex:
+    """
+    Decoder snapshots (input and output positions plus the 4 KB window) taken
+    every interval output bytes, so decoding can resume near any offset.
+    """
+    interval: int
+    source_size: int
+    source_crc: int
+    checkpoints: List[LZSCheckpoint] = field(default_factory=list)
+
+    MAGIC = b"LZSI"
+    VERSION = 1
+    HEADER = Struct("<4sHIIII")
+    ENTRY = Struct("<III")
+
+    @classmethod
+    def build(cls, data, interval=0x4000):
+        end = _payload_end(data)
+        out = bytearray(RING_SIZE + (end - 4) * 9)
+        pos = 4
+        o = RING_SIZE
+        checkpoints = []
+        while pos < end:
+            pos, o = _inflate(data, pos, end, out, o, o + interval)
+            if pos < end:
+                checkpoints.append(LZSCheckpoint(pos, o - RING_SIZE, bytes(out[o - RING_SIZE:o])))
+        return cls(interval, len(data), crc32(data), checkpoints)
+
+    def find(self, offset) -> Optional[LZSCheckpoint]:
+        i = bisect_right([c.output_pos for c in self.checkpoints], offset)
+        return self.checkpoints[i - 1] if i else None
+
+    def matches(self, data) -> bool:
+        return self.source_size == len(data) and self.source_crc == crc32(data)
+
+    def save(self, path: str):
+        # written aside and moved in place, a killed or concurrent writer leaves no half index
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.interval, self.source_size,
+                                     self.source_crc, len(self.checkpoints)))
+            for c in self.checkpoints:
+                window = zlib_compress(c.window)
+                f.write(self.ENTRY.pack(c.input_pos, c.output_pos, len(window)))
+                f.write(window)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, version, interval, source_size, source_crc, count = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError(f"{path} is not an LZS index")
+        pos = cls.HEADER.size
+        checkpoints = []
+        for _ in range(count):
+            input_pos, output_pos, length = cls.ENTRY.unpack_from(data, pos)
+            pos += cls.ENTRY.size
+            window = zlib_decompress(data[pos:pos + length])
+            if len(window) != RING_SIZE:
+                raise ValueError(f"{path} has a truncated checkpoint window")
+            checkpoints.append(LZSCheckpoint(input_pos, output_pos, window))
+            pos += length
+        return cls(interval, source_size, source_crc, checkpoints)
+
+    @classmethod
+    def for_file(cls, path: str, data=None, interval=0x4000, sidecar=None):
+        """
+        Load the sidecar index of path, rebuilding and saving it when missing,
+        unreadable or out of date with the file. The sidecar defaults to
+        path + ".idx", a directory given as sidecar holds NAME.idx instead for
+        read-only source directories. When it can't be written, the rebuilt
+        index is only returned.
+        """
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+        if sidecar is None:
+            sidecar = path + ".idx"
+        elif os.path.isdir(sidecar):
+            sidecar = os.path.join(sidecar, os.path.basename(path) + ".idx")
+        try:
+            index = cls.load(sidecar)
+            if index.matches(data) and index.interval == interval:
+                return index
+        except (OSError, ValueError, StructError, ZlibError):
+            pass
+        index = cls.build(data, interval)
+        try:
+            index.save(sidecar)
+        except OSError:
+            pass
+        return index
@@ -0,0 +1,140 @@
+from construct import Subconstruct
+from contextlib import contextmanager
+from cProfile import Profile
+from json import dump
+from time import perf_counter
+import atexit
+import os
+
+# FF7PY_PROFILE=report.json turns profiling on for the whole process and writes
+# the report at exit, FF7PY_CPROFILE=1 also writes report.json.prof
+PROFILE_ENV = "FF7PY_PROFILE"
+CPROFILE_ENV = "FF7PY_CPROFILE"
+
+class Profiler:
+    """
+    Opt-in timings of the load pipeline. Each stage records its wall time, the
+    stage it runs inside of, if any, and when known the bytes it processed and the
+    objects it produced. Disabled, a stage costs one attribute check.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.records = []
+        self.cprofile = None
+        self.open_stages = []
+
+    def enable(self, cprofile=False):
+        self.enabled = True
+        if cprofile and self.cprofile is None:
+            self.cprofile = Profile()
+            self.cprofile.enable()
+
+    def disable(self):
+        self.enabled = False
+        if self.cprofile is not None:
+            self.cprofile.disable()
+
+    def reset(self):
+        self.records = []
+        self.open_stages = []
+        if self.cprofile is not None:
+            self.cprofile.disable()
+            self.cprofile = Profile()
+            self.cprofile.enable()
+
+    @contextmanager
+    def stage(self, name, **counts):
+        """
+        Times the block as one run of stage name. The yielded dict takes the
+        counts only known at the end, e.g. record["objects"] = len(result).
+        """
+        if not self.enabled:
+            yield {}
+            return
+        record = dict(counts)
+        parent = self.open_stages[-1] if self.open_stages else None
+        self.open_stages.append(name)
+        start = perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = perf_counter() - start
+            record["stage"] = name
+            record["parent"] = parent
+            self.open_stages.pop()
+            self.records.append(record)
+
+    def report(self) -> dict:
+        stages = {}
+        for record in self.records:
+            stage = stages.setdefault(record["stage"], {"calls": 0, "seconds": 0.0})
+            stage["calls"] += 1
+            for key, value in record.items():
+                if key not in ("stage", "parent"):
+                    stage[key] = stage.get(key, 0) + value
+        return {
+            "pid": os.getpid(),
+            # nested stages are already part of the time of the stage they run inside of
+            "total_seconds": sum(r["seconds"] for r in self.records if r["parent"] is None),
+            "stages": stages,
+            "records": self.records
+        }
+
+    def dump(self, path):
+        """Writes report() as JSON to path, and the cProfile stats to path + '.prof' when collected."""
+        with open(path, "w", encoding="utf-8") as f:
+            dump(self.report(), f, indent=2)
+        if self.cprofile is not None:
+            self.cprofile.create_stats()
+            self.cprofile.dump_stats(path + ".prof")
+
+profiler = Profiler()
+
+class _FurthestRead:
+    """
+    Stream wrapper remembering the furthest offset reached, Pointers seek back before
+    it and the instruction decoders seek past the runs they decode from the buffer.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+        self.furthest = stream.tell()
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.furthest = max(self.furthest, self.stream.tell())
+        return data
+
+    def seek(self, offset, whence=0):
+        position = self.stream.seek(offset, whence)
+        self.furthest = max(self.furthest, position)
+        return position
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+class Timed(Subconstruct):
+    """
+    Records the parse of subcon as a profiler stage, its bytes going from the start
+    to the furthest offset read, which covers what subcon parses through Pointers.
+    """
+    def __init__(self, stage, subcon):
+        super().__init__(subcon)
+        self.stage = stage
+
+    def _parse(self, stream, context, path):
+        if not profiler.enabled:
+            return self.subcon._parsereport(stream, context, path)
+        with profiler.stage(self.stage) as record:
+            start = stream.tell()
+            tracked = _FurthestRead(stream)
+            obj = self.subcon._parsereport(tracked, context, path)
+            record["bytes"] = tracked.furthest - start
+        return obj
+
+def _env_flag(name) -> bool:
+    """Whether environment variable name is set to 1, true, yes or on, in any case."""
+    return os.environ.get(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+if os.environ.get(PROFILE_ENV):
+    profiler.enable(cprofile=_env_flag(CPROFILE_ENV))
+    atexit.register(profiler.dump, os.environ[PROFILE_ENV])